@@ -0,0 +1,169 @@
+import os, sys, json, time, random, argparse, tempfile, platform, statistics
+
+# pygame prints a banner to stdout on import, which would break the JSON written there
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import pygame
+from game import Game
+from scripts.entities import Enemy
+from scripts.level import LEVEL_EXTENSION
+
+DEFAULT_SIZES = (518, 10000, 100000)
+
+def build_tilemap(tilemap, tile_count, seed=0):
+    # rolling ground with a stone layer, floating platforms, magic blocks and door columns,
+    # laid out left to right until tile_count tiles have been placed
+    rng = random.Random(seed)
+    tilemap.chunks = {}
+    tilemap.type_index = {}
+    tilemap.set_offgrid([])
+    placed = 0
+    x = 0
+    while placed < tile_count:
+        ground = 2 + rng.randint(-1, 1)
+        column = [(ground, "grass")] + [(ground + depth, "stone") for depth in range(1, 4)]
+        if x % 12 == 5:
+            column.append((ground - 4, rng.choice(("pink", "blue", "pink_border", "blue_border"))))
+        if x % 20 == 10:
+            column.append((ground - 3, "grass"))
+        if x % 200 == 199:
+            column.extend((ground - height, "yellow_key_door") for height in range(1, 4))
+        for y, tile_type in column:
+            if placed < tile_count:
+                tilemap.set_tile(x, y, tile_type, rng.randrange(len(tilemap.game.assets[tile_type])))
+                placed += 1
+        x += 1
+    # a new chunk dict makes navigation graphs rebuild everything, so the cells set_tile queued are stale
+    for graph in tilemap.navigation_graphs:
+        graph.dirty_cells.clear()
+    return x
+
+def measure(function, repeat, number=1):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - start) / number)
+    return {"median_us": statistics.median(times) * 1e6, "min_us": min(times) * 1e6, "repeat": repeat, "number": number}
+
+def bench_tilemap(game, tile_count, repeat):
+    results = {}
+    tilemap = game.tilemap
+    width = build_tilemap(tilemap, tile_count)
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "map.json")
+    binary_path = os.path.join(directory, "map" + LEVEL_EXTENSION)
+
+    results["save"] = measure(lambda: tilemap.save(path), max(1, repeat // 10))
+    results["load"] = measure(lambda: tilemap.load(path), max(1, repeat // 10))
+    results["save_binary"] = measure(lambda: tilemap.save(binary_path), max(1, repeat // 10))
+    results["load_binary"] = measure(lambda: tilemap.load(binary_path), max(1, repeat // 10))
+
+    rng = random.Random(1)
+    positions = [(rng.uniform(0, width * tilemap.size), rng.uniform(-4 * tilemap.size, 2 * tilemap.size)) for _ in range(1000)]
+    results["tiles_around"] = measure(lambda: [tilemap.tiles_around(position, 64) for position in positions], repeat)
+    results["tiles_around"]["calls"] = len(positions)
+    results["rects_around"] = measure(lambda: [tilemap.rects_around(position, 64) for position in positions], repeat)
+    results["rects_around"]["calls"] = len(positions)
+
+    results["update_magic_tiles"] = measure(lambda: (tilemap.update_magic_tiles(), game.player.switch_colors()), repeat)
+
+    surface = pygame.Surface(game.display.get_size())
+    # the camera scrolls 4 pixels a frame along the ground, like the game does; the first pass bakes
+    # every chunk it touches, later passes measure the steady state as the path stays within
+    # the tilemap's baked chunk limit
+    start = rng.uniform(0, max(0, width * tilemap.size - 400))
+    offsets = [(int(start) + frame * 4, -135) for frame in range(100)]
+    results["render_cold"] = measure(lambda: [tilemap.render(surface, offset) for offset in offsets], 1)
+    results["render"] = measure(lambda: [tilemap.render(surface, offset) for offset in offsets], repeat)
+    results["render"]["calls"] = len(offsets)
+    return results, width
+
+def bench_physics(game, enemy_count, width, repeat, frames=60, batched=False):
+    rng = random.Random(2)
+    game.enemies = []
+    world = None
+    if batched:
+        from scripts.physics import PhysicsWorld
+        world = PhysicsWorld(game.tilemap)
+    # the player stands on the ground mid-map with a quarter of the enemies dropped within chasing
+    # range, so those follow the navigation graph across the platforms
+    size = game.tilemap.size
+    column = width // 2
+    ground = next(y for y in range(-10, 10) if game.tilemap.is_solid(column, y))
+    game.player.position = [column * size, ground * size - game.player.size[1]]
+    for id in range(enemy_count):
+        if id % 4:
+            x = rng.uniform(0, width * size)
+        else:
+            x = game.player.position[0] + rng.uniform(-260, 260)
+        game.enemies.append(Enemy(id, game, [x, -200], (48, 64)))
+        if world:
+            world.add(game.enemies[-1])
+
+    def step():
+        for enemy in game.enemies:
+            enemy.update()
+        if world:
+            for enemy in world.step():
+                enemy.finish_update()
+
+    result = measure(step, repeat, frames)
+    result["enemies"] = enemy_count
+    return result
+
+def run(sizes, enemy_counts, repeat, batched=False):
+    game = Game(headless=True)
+    game.set_up_game_loop()
+    results = {}
+    for tile_count in sizes:
+        tilemap_results, width = bench_tilemap(game, tile_count, repeat)
+        # enemies chase the player across platforms along the navigation graph
+        game.navigation.update()
+        for enemy_count in enemy_counts:
+            tilemap_results["physics_update/" + str(enemy_count)] = bench_physics(game, enemy_count, width, repeat)
+            if batched:
+                tilemap_results["physics_batched/" + str(enemy_count)] = bench_physics(game, enemy_count, width, repeat, batched=True)
+        results[str(tile_count)] = tilemap_results
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+def compare(previous, current):
+    for size in current["results"]:
+        if size not in previous["results"]:
+            continue
+        for name, result in current["results"][size].items():
+            before = previous["results"][size].get(name)
+            if before:
+                ratio = result["median_us"] / before["median_us"]
+                print(size.rjust(8) + "  " + name.ljust(24) + str(round(before["median_us"], 1)).rjust(14) + str(round(result["median_us"], 1)).rjust(14) + ("x" + str(round(ratio, 2))).rjust(10))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the tilemap, physics and render hot paths on synthetic levels.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="tile counts of the synthetic maps")
+    parser.add_argument("--enemies", type=int, nargs="+", default=(10, 100, 500), help="enemy counts for the physics benchmark")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--batched-physics", action="store_true", help="also time the NumPy PhysicsWorld")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--compare", help="previous JSON results to print before/after medians against")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.enemies, args.repeat, args.batched_physics)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare, "r") as file:
+            compare(json.load(file), results)
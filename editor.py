@@ -1,6 +1,8 @@
 import pygame, sys
-from scripts.tilemap import Tilemap
-from scripts.utils import load_image, load_images
+from scripts.tilemap import Tilemap, Tile
+from scripts.utils import load_image, load_images, image_manifest, preload_images, render_text
+from scripts.presenter import Presenter
+from scripts.journal import MapJournal
 
 RENDER_SCALE = 2.0
 
@@ -11,8 +13,10 @@ class Game:
 
         self.screen = pygame.display.set_mode((960, 540))
         self.display = pygame.Surface((480, 270))
+        self.presenter = Presenter(self.screen, self.display)
         self.clock = pygame.time.Clock()
         
+        preload_images(image_manifest("tiles"))
         self.assets = {
             "grass": load_images("tiles/grass"),
             "stone": load_images("tiles/stone"),
@@ -30,6 +34,8 @@ class Game:
             self.tilemap.load("data/map.json")
         except FileNotFoundError:
             pass
+        # edits since the last compaction are replayed from data/map.json.journal
+        self.journal = MapJournal(self.tilemap, "data/map.json")
 
         self.scroll = [0, 0]
 
@@ -40,6 +46,64 @@ class Game:
         self.right_clicking = False
         self.shift = False
         self.on_grid = True
+        self.preview_images = {}
+        # brush paints while held, rect fills the dragged rectangle, fill floods the clicked region
+        self.tool = "brush"
+        self.rect_start = None
+        self.stroke = None
+        self.history = []
+        self.redo_stack = []
+        # a short message under the tile preview, shown for notice_frames frames
+        self.font = pygame.font.SysFont("Arial", 12, bold=True)
+        self.notice = None
+        self.notice_frames = 0
+
+    def record(self, step):
+        step = [action for action in step if action[1]]
+        if step:
+            self.history.append(step)
+            self.redo_stack.clear()
+
+    def revert(self, step):
+        # a step is a list of ("tiles", changes), ("offgrid_add", tile) and ("offgrid_remove", tile)
+        # actions that undo an edit; applying it returns the step that redoes the edit
+        inverse = []
+        for kind, data in reversed(step):
+            if kind == "tiles":
+                inverse.append(("tiles", self.tilemap.edit(data)))
+            elif kind == "offgrid_remove":
+                self.tilemap.remove_offgrid(data)
+                inverse.append(("offgrid_add", data))
+            else:
+                self.tilemap.add_offgrid(data)
+                inverse.append(("offgrid_remove", data))
+        return inverse
+
+    def undo(self):
+        if self.history:
+            self.redo_stack.append(self.revert(self.history.pop()))
+
+    def redo(self):
+        if self.redo_stack:
+            self.history.append(self.revert(self.redo_stack.pop()))
+
+    def paint(self, changes):
+        undo = self.tilemap.edit(changes)
+        if undo:
+            self.stroke.append(("tiles", undo))
+
+    def fill(self, tile_position, tile_type):
+        region = self.tilemap.flood_region(*tile_position)
+        if region is None:
+            self.notice = "fill region too large"
+            self.notice_frames = 120
+        else:
+            self.record([("tiles", self.tilemap.edit([(x, y, tile_type, self.tile_variant) for x, y in region]))])
+
+    def rect_cells(self, tile_position):
+        left, right = sorted((self.rect_start[0], tile_position[0]))
+        top, bottom = sorted((self.rect_start[1], tile_position[1]))
+        return left, top, right, bottom
 
     def run(self) -> None:
         counter = 0
@@ -51,50 +115,58 @@ class Game:
             render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
             self.tilemap.render(self.display, offset=render_scroll)
 
-            current_tile_image = self.assets[self.tile_list[self.tile_group]][self.tile_variant].copy()
-            current_tile_image.set_alpha(100)
+            preview = (self.tile_list[self.tile_group], self.tile_variant)
+            if preview not in self.preview_images:
+                self.preview_images[preview] = self.assets[preview[0]][preview[1]].copy()
+                self.preview_images[preview].set_alpha(100)
+            current_tile_image = self.preview_images[preview]
 
             mouse_position = pygame.mouse.get_pos()
             mouse_position = (mouse_position[0] / RENDER_SCALE, mouse_position[1] / RENDER_SCALE)
             tile_position = (int((mouse_position[0] + self.scroll[0]) // self.tilemap.size), int((mouse_position[1] + self.scroll[1]) // self.tilemap.size)) 
             print(tile_position) if counter % 60 == 0 else None
             self.display.blit(current_tile_image, (5,5))
-            if self.on_grid:
+            if self.notice_frames:
+                render_text(self.display, self.notice, self.font, (255, 255, 255), (5, 10 + self.tilemap.size))
+                self.notice_frames -= 1
+            if self.rect_start:
+                left, top, right, bottom = self.rect_cells(tile_position)
+                size = self.tilemap.size
+                pygame.draw.rect(self.display, (255, 255, 255), (left * size - self.scroll[0], top * size - self.scroll[1], (right - left + 1) * size, (bottom - top + 1) * size), 1)
+            elif self.on_grid:
                 self.display.blit(current_tile_image, (tile_position[0] * self.tilemap.size - self.scroll[0], tile_position[1] * self.tilemap.size - self.scroll[1]))
             else:
                 self.display.blit(current_tile_image, mouse_position)
 
-            if self.clicking and self.on_grid:
-                self.tilemap.tilemap[str(tile_position[0]) + ";" + str(tile_position[1])] = {
-                    "type": self.tile_list[self.tile_group],
-                    "variant": self.tile_variant,
-                    "pos": tile_position
-                }
-            if self.right_clicking :
-                tile_location = str(tile_position[0]) + ";" + str(tile_position[1])
-                if tile_location in self.tilemap.tilemap:
-                    del self.tilemap.tilemap[tile_location]
-
-                for tile in self.tilemap.offgrid_tiles.copy():
-                    tile_image = self.assets[tile["type"]][tile["variant"]]
-                    tile_rectangle = pygame.Rect(tile["pos"][0] - self.scroll[0], tile["pos"][1] - self.scroll[1], tile_image.get_width(), tile_image.get_height())
-                    
-                    if tile_rectangle.collidepoint(mouse_position):
-                        self.tilemap.offgrid_tiles.remove(tile)
+            if self.tool == "brush" and self.stroke is not None:
+                if self.clicking and self.on_grid:
+                    self.paint([(tile_position[0], tile_position[1], self.tile_list[self.tile_group], self.tile_variant)])
+                if self.right_clicking:
+                    self.paint([(tile_position[0], tile_position[1], None, 0)])
+                    for tile in self.tilemap.offgrid_at((mouse_position[0] + self.scroll[0], mouse_position[1] + self.scroll[1])):
+                        self.tilemap.remove_offgrid(tile)
+                        self.stroke.append(("offgrid_add", tile))
             
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    self.journal.close()
                     pygame.quit()
                     sys.exit()
                 if event.type == pygame.MOUSEBUTTONDOWN:
+                    if event.button in (1, 3):
+                        tile_type = self.tile_list[self.tile_group] if event.button == 1 else None
+                        if event.button == 1 and not self.on_grid:
+                            tile = Tile(tile_type, self.tile_variant, (mouse_position[0] + self.scroll[0], mouse_position[1] + self.scroll[1]))
+                            self.tilemap.add_offgrid(tile)
+                            self.record([("offgrid_remove", tile)])
+                        elif self.tool == "brush":
+                            self.stroke = []
+                        elif self.tool == "rect":
+                            self.rect_start = tile_position
+                        elif self.tool == "fill":
+                            self.fill(tile_position, tile_type)
                     if event.button == 1:
                         self.clicking = True
-                        if not self.on_grid:
-                            self.tilemap.offgrid_tiles.append({
-                                "type": self.tile_list[self.tile_group],
-                                "variant": self.tile_variant,
-                                "pos": (mouse_position[0] + self.scroll[0], mouse_position[1] + self.scroll[1])
-                            })
                     if event.button == 3:
                         self.right_clicking = True
 
@@ -112,6 +184,16 @@ class Game:
                             self.tile_group = (self.tile_group + 1) % len(self.tile_list)
 
                 if event.type == pygame.MOUSEBUTTONUP:
+                    if event.button in (1, 3):
+                        if self.stroke is not None:
+                            self.record(self.stroke)
+                            self.stroke = None
+                        if self.rect_start:
+                            left, top, right, bottom = self.rect_cells(tile_position)
+                            tile_type = self.tile_list[self.tile_group] if event.button == 1 else None
+                            changes = [(x, y, tile_type, self.tile_variant) for x in range(left, right + 1) for y in range(top, bottom + 1)]
+                            self.record([("tiles", self.tilemap.edit(changes))])
+                            self.rect_start = None
                     if event.button == 1:
                         self.clicking = False
                     if event.button == 3:
@@ -131,9 +213,22 @@ class Game:
                     if event.key == pygame.K_g:
                         self.on_grid = not self.on_grid
                     if event.key == pygame.K_o:
-                        self.tilemap.save("data/map.json")
+                        self.journal.compact()
                     if event.key == pygame.K_t:
-                        self.tilemap.autotile()
+                        self.record([("tiles", self.tilemap.autotile())])
+                    if event.key == pygame.K_b:
+                        self.tool = "brush"
+                    if event.key == pygame.K_r:
+                        self.tool = "rect"
+                    if event.key == pygame.K_f:
+                        self.tool = "fill"
+                    if event.key == pygame.K_z and event.mod & pygame.KMOD_CTRL:
+                        if event.mod & pygame.KMOD_SHIFT:
+                            self.redo()
+                        else:
+                            self.undo()
+                    if event.key == pygame.K_y and event.mod & pygame.KMOD_CTRL:
+                        self.redo()
 
                 if event.type == pygame.KEYUP:
                     if event.key == pygame.K_d:
@@ -147,8 +242,8 @@ class Game:
                     if event.key == pygame.K_LSHIFT:
                         self.shift = False
 
-            self.screen.blit(pygame.transform.scale(self.display, self.screen.get_size()), (0, 0))
-            pygame.display.update()
+            self.journal.flush()
+            self.presenter.present()
             self.clock.tick(60)
             counter+= 1
 
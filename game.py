@@ -1,16 +1,45 @@
-import pygame, sys
+import pygame, sys, os, time, random, atexit, hashlib, argparse
 
-from scripts.utils import load_image, load_images, render_text, load, Animation, Dialogue
+from scripts.utils import load_image, load_images, preload_images, render_text, load, Animation, Dialogue
 from scripts.entities import Player, Enemy, Villager
 from scripts.tilemap import Tilemap
+from scripts.level import LEVEL_EXTENSION, is_level_file
+from scripts.spatial import SpatialHash
+from scripts.inputs import load_script, default_script, InputRecorder, InputReplay
+from scripts.profiler import FrameProfiler
+from scripts.presenter import Presenter
+from scripts.snapshot import save_snapshot, load_snapshot
+from scripts.navigation import NavGraph
+from scripts.journal import write_atomic
+
+QUICK_SAVE = "data/saves/quick.sav"
+STEP = 1 / 60
+MAX_STEPS = 15
+# an entity that moved further than this in one step was placed, not moved, so it isn't interpolated
+TELEPORT_DISTANCE = 64
 
 class Game:
-    def __init__(self) -> None:
+    def __init__(self, headless=False, level="data/map.json", stream=False, batched_physics=False, window_size=(960, 540), activity_margin=480, seed=None, checkpoints=False) -> None:
+        self.headless = headless
+        self.batched_physics = batched_physics
+        self.activity_margin = activity_margin
+        # every random choice in a run comes from this generator, so a seed and the inputs reproduce it
+        self.seed = random.randrange(2 ** 32) if seed is None else seed
+        self.random = random.Random(self.seed)
+        # with checkpoints on, every rescued villager saves a snapshot that a death goes back to
+        self.checkpoints = checkpoints
+        self.checkpoint = None
+        self.quick_save = None
+        if headless:
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
+            os.environ["SDL_AUDIODRIVER"] = "dummy"
         pygame.init()
         pygame.display.set_caption("Connect a Witch!")
 
-        self.screen = pygame.display.set_mode((960, 540))
+        self.screen = pygame.display.set_mode(window_size)
         self.display = pygame.Surface((480, 270))
+        self.presenter = Presenter(self.screen, self.display)
+        self.presented_screen = None
         self.clock = pygame.time.Clock()
 
         self.scroll = [0, 0]
@@ -21,10 +50,19 @@ class Game:
         self.game_over = False
         self.advance = False
         self.on_victory_screen = False
+        self.input_source = None
+        self.profiler = FrameProfiler()
+        # run() draws the game alpha of the way from the previous step's positions to the current ones
+        self.alpha = 1
+        self.previous_scroll = None
+        self.previous_positions = {}
 
-        self.title_font = pygame.font.SysFont("Arial", 30, bold=True)
-        self.sub_title_font = pygame.font.SysFont("Arial", 20, bold=True)
+        if not headless:
+            self.title_font = pygame.font.SysFont("Arial", 30, bold=True)
+            self.sub_title_font = pygame.font.SysFont("Arial", 20, bold=True)
 
+        preload_images()
+        self.enemy_spawn_points, self.player_spawn_point = load()
         self.assets = {
             "background": load_image("background.png"),
             "grass": load_images("tiles/grass"),
@@ -77,17 +115,18 @@ class Game:
 
         self.tilemap = Tilemap(self, tile_size=48)
         try:
-            self.tilemap.load("data/map.json")
+            if stream:
+                self.tilemap.stream(level)
+            else:
+                self.tilemap.load(level)
         except FileNotFoundError:
             pass
+        # walk, drop and jump links between platforms for enemies chasing the player
+        self.navigation = NavGraph(self.tilemap)
 
-    def set_up_game_loop(self):
-        enemy_spawners, player_spawner = load()
-        self.player = Player(self, [player_spawner[0], player_spawner[1]], (48, 64), 3)
-        self.hearts = []
-        self.heartless = []
-        for i in range(self.player.health):
-            self.hearts.append((load_image("ui/heart.png"), (80 + 30 * i, 16)))
+    def set_up_game_loop(self, spawn=True):
+        self.player = Player(self, [self.player_spawn_point[0], self.player_spawn_point[1]], (48, 64), 3)
+        self.rebuild_hearts()
         self.horizontal_movement = [False, False]
         self.projectiles = []
         self.explosions = []
@@ -98,18 +137,99 @@ class Game:
         self.red_door_removed = False
 
         self.enemies = []
-        id = 0
-        for spawner in enemy_spawners:
-            self.enemies.append(Enemy(id, self, [spawner[0], spawner[1]], (48, 64)))
-            id+=1
+        self.enemy_grid = SpatialHash()
+        self.physics_world = None
+        if self.batched_physics:
+            from scripts.physics import PhysicsWorld
+            self.physics_world = PhysicsWorld(self.tilemap)
+        self.enemy_spawners = list(enumerate(self.enemy_spawn_points))
         self.villagers= []
-        self.enemy_total = len(self.enemies)
+        self.villager_grid = SpatialHash()
+        self.enemy_total = len(self.enemy_spawners)
         self.enemy_counter = 0
+        self.scroll = [int(self.player.rect().centerx - self.display.get_width() / 2.5), int(self.player.rect().centery - self.display.get_height() / 1.9)]
+        if spawn:
+            self.spawn_enemies()
 
-    def title_screen(self):
+    def rebuild_hearts(self):
+        # the same layout Player.hit and Player.upgrade_life leave behind
+        self.hearts = [(self.ui["heart"], (80 + 30 * i, 16)) for i in range(self.player.health)]
+        self.heartless = [(self.ui["heartless"], (80 + 30 * i, 16)) for i in range(self.player.health_maximum - 1, max(self.player.health, 1) - 1, -1)]
+
+    def add_enemy(self, enemy):
+        self.enemies.append(enemy)
+        if self.physics_world:
+            self.physics_world.add(enemy)
+        self.enemy_grid.insert(enemy, enemy.rect())
+
+    def add_villager(self, villager):
+        self.villagers.append(villager)
+        if self.physics_world:
+            self.physics_world.add(villager)
+        self.villager_grid.insert(villager, villager.rect())
+
+    def spawn_enemies(self):
+        for id, spawner in self.enemy_spawners.copy():
+            if self.tilemap.is_resident(spawner):
+                self.add_enemy(Enemy(id, self, [spawner[0], spawner[1]], (48, 64)))
+                self.enemy_spawners.remove((id, spawner))
+
+    def save_quick(self):
+        self.quick_save = save_snapshot(self)
+        write_atomic(QUICK_SAVE, self.quick_save)
+
+    def load_quick(self):
+        if self.quick_save is None and os.path.exists(QUICK_SAVE):
+            with open(QUICK_SAVE, "rb") as file:
+                self.quick_save = file.read()
+        if self.quick_save is None:
+            return
+        try:
+            load_snapshot(self, self.quick_save)
+        except ValueError:
+            # a save from an older version or one cut off on disk; the game is left as it was
+            self.quick_save = None
+            if os.path.exists(QUICK_SAVE):
+                os.remove(QUICK_SAVE)
+            return
+        self.presented_screen = None
+
+    def state_hash(self):
+        state = [self.on_title_screen, self.on_game, self.game_over, self.on_victory_screen, self.scroll]
+        if hasattr(self, "player"):
+            player = self.player
+            state += [
+                [float(value) for value in player.position], [float(value) for value in player.velocity], player.health, player.projectile_type,
+                player.invincibility, player.shoot_cooldown, player.jumps, self.enemy_counter, self.yellow_key, self.red_key,
+                self.tilemap.magic_state, sorted(self.tilemap.removed_types),
+            ]
+            for enemy in self.enemies:
+                state.append((enemy.id, [float(value) for value in enemy.position], [float(value) for value in enemy.velocity], enemy.attack_cooldown, [weakness.type for weakness in enemy.weaknesses]))
+            for villager in self.villagers:
+                state.append([float(value) for value in villager.position])
+            for projectile in self.projectiles:
+                state.append((projectile.type, projectile.position))
+        return int.from_bytes(hashlib.blake2b(repr(state).encode(), digest_size=8).digest(), "little")
+
+    def view_rect(self, margin=0):
+        return pygame.Rect(self.scroll[0] - margin, self.scroll[1] - margin, self.display.get_width() + 2 * margin, self.display.get_height() + 2 * margin)
+
+    def events(self):
+        events = self.input_source.get() if self.input_source else pygame.event.get()
+        for event in events:
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                self.profiler.toggle_overlay()
+            # the window lost what was last presented, so a static screen has to be drawn again
+            if event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE, pygame.WINDOWRESTORED):
+                self.presented_screen = None
+        return events
+
+    def render_title_screen(self):
         render_text(self.display, "Connect a Witch!", self.title_font, (255, 255, 255), (self.display.get_width() / 4, self.display.get_height() / 2 - 80))
         render_text(self.display, "Move with arrow keys\nJump with Space\nSwitch magic with D\nShoot with F\nPress Space to play!", self.sub_title_font, (255, 255, 255), (self.display.get_width() / 3, self.display.get_height() / 2 - 25))
-        for event in pygame.event.get():
+
+    def title_screen(self):
+        for event in self.events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -119,6 +239,7 @@ class Game:
                     self.set_up_game_loop()
                     self.on_title_screen = False
                     self.on_game = True
+        self.profiler.mark("events")
 
     def game_loop(self):
         def rewards(enemy):
@@ -130,58 +251,72 @@ class Game:
             #elif enemy.id == 5:
             #   self.red_key = True
 
+        self.tilemap.update_streaming(self.scroll, self.display.get_size())
+        self.spawn_enemies()
+        self.profiler.mark("streaming")
+
         update_movement = ((self.horizontal_movement[1] - self.horizontal_movement[0]) * 3.5, 0)
         self.player.update(update_movement)
         self.scroll[0] += (self.player.rect().centerx - self.display.get_width() / 2.5 - self.scroll[0]) / 15
         self.scroll[1] += (self.player.rect().centery - self.display.get_height() / 1.9 - self.scroll[1])
         self.scroll = [int(self.scroll[0]), int(self.scroll[1])]
+        self.profiler.mark("player")
 
-        for villager in self.villagers.copy():
-            villager.update()
-            villager.render(self.display, self.scroll)
-
-        self.tilemap.render(self.display, self.scroll)
-        if not self.player.invincibility or self.player.invincibility % 10 == 0:
-            self.player.render(self.display, self.scroll)
+        # only enemies and villagers within activity_margin of the view are simulated; the rest keep
+        # their state untouched in the grids until the camera comes back
+        active_rect = self.view_rect(self.activity_margin)
+        awake_villagers = self.villager_grid.query(active_rect)
+        for villager in awake_villagers:
+            if self.tilemap.is_resident(villager.position):
+                villager.update()
+        self.profiler.mark("villagers")
 
         for projectile in self.projectiles.copy():
             if projectile.update():
                 self.projectiles.remove(projectile)
                 continue
-            for enemy in self.enemies.copy():
-                if projectile.rect().colliderect(enemy.rect()):
-                    self.projectiles.remove(projectile)
-                    if projectile.type == enemy.weaknesses[0].type:
-                        kill = enemy.hit()
-                        if kill:
-                            rewards(enemy)
-                            self.enemies.remove(enemy)
-                            self.enemy_counter +=1
-                            self.villagers.append(Villager(self, enemy.position, (48, 64)))
-                    else:
-                        enemy.reset()
-            projectile.render(self.display, self.scroll)
-        
-        for enemy in self.enemies.copy():
-            enemy.update()
-            enemy.render(self.display, self.scroll)
-            if enemy.attack_cooldown > 0 and enemy.attack_cooldown < 60:
-                if enemy.rect().colliderect(self.player.rect()) and not self.player.invincibility:
-                    self.player.hit(1)
+            for enemy in self.enemy_grid.query(projectile.rect()):
+                self.projectiles.remove(projectile)
+                if projectile.type == enemy.weaknesses[0].type:
+                    kill = enemy.hit()
+                    if kill:
+                        rewards(enemy)
+                        self.enemies.remove(enemy)
+                        self.enemy_grid.remove(enemy)
+                        self.enemy_counter +=1
+                        if self.physics_world:
+                            self.physics_world.remove(enemy)
+                        self.add_villager(Villager(self, enemy.position, (48, 64)))
+                        if self.checkpoints:
+                            self.checkpoint = save_snapshot(self)
+                else:
+                    enemy.reset()
+                break
+        self.profiler.mark("projectiles")
 
-        self.display.blit(self.ui["spell/" + self.player.projectile_type], (16, 16))
-        self.display.blit(self.ui["staff"], (16, 16))
-        for heart in self.hearts:
-            self.display.blit(heart[0], heart[1])
-        for heart in self.heartless:
-            self.display.blit(heart[0], heart[1])
-        render_text(self.display, str(self.enemy_counter) + "/" + str(self.enemy_total), self.title_font, (255, 255, 255), (self.display.get_width() - 80, 16))
-        if self.yellow_key:
-            self.display.blit(self.ui["yellow_key"], (90, 48))
-        if self.red_key:
-            self.display.blit(self.ui["red_key"], (120, 48))
+        self.navigation.update()
+        awake_enemies = self.enemy_grid.query(active_rect)
+        for enemy in awake_enemies:
+            if self.tilemap.is_resident(enemy.position):
+                enemy.update()
+        self.profiler.mark("enemies")
+
+        if self.physics_world:
+            for entity in self.physics_world.step():
+                entity.finish_update()
+            self.profiler.mark("physics")
 
-        for event in pygame.event.get():
+        # sleeping entities never move, so only the awake ones need their grid cells refreshed
+        for enemy in awake_enemies:
+            self.enemy_grid.move(enemy, enemy.rect())
+        for villager in awake_villagers:
+            self.villager_grid.move(villager, villager.rect())
+        for enemy in self.enemy_grid.query(self.player.rect()):
+            if enemy.attack_cooldown > 0 and enemy.attack_cooldown < 60 and not self.player.invincibility:
+                self.player.hit(1)
+        self.profiler.mark("collisions")
+
+        for event in self.events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -199,25 +334,93 @@ class Game:
                     if not self.tilemap.check_tile(self.player.position, self.player.size[1]) in {"pink_border", "blue_border"}:
                         self.tilemap.update_magic_tiles()
                         self.player.switch_colors()
+                if event.key == pygame.K_F5:
+                    self.save_quick()
+                if event.key == pygame.K_F9:
+                    self.load_quick()
 
             if event.type == pygame.KEYUP:
                 if event.key == pygame.K_LEFT:
                     self.horizontal_movement[0] = False
                 if event.key == pygame.K_RIGHT:
                     self.horizontal_movement[1] = False
+        self.profiler.mark("events")
 
         if self.enemy_counter == self.enemy_total:
             self.on_game = False
             self.on_victory_screen = True
             
+        elif self.player.health == 0 and self.checkpoint:
+            load_snapshot(self, self.checkpoint)
+
         elif self.player.health == 0:
             self.on_game = False
             self.game_over = True
 
-    def game_over_screen(self):
+    def remember_positions(self):
+        self.previous_scroll = tuple(self.scroll)
+        self.previous_positions = {}
+        if self.on_game:
+            nearby_rect = self.view_rect(128)
+            for entity in [self.player] + self.projectiles + self.enemy_grid.query(nearby_rect) + self.villager_grid.query(nearby_rect):
+                self.previous_positions[entity] = (entity.position[0], entity.position[1])
+
+    def interpolated_scroll(self):
+        previous = self.previous_scroll
+        if previous is None or abs(self.scroll[0] - previous[0]) + abs(self.scroll[1] - previous[1]) > TELEPORT_DISTANCE:
+            return self.scroll
+        return [int(previous[0] + (self.scroll[0] - previous[0]) * self.alpha), int(previous[1] + (self.scroll[1] - previous[1]) * self.alpha)]
+
+    def render_offset(self, entity, scroll):
+        # shifting the offset by the rest of the step draws the entity, and whatever it draws relative
+        # to its position, between its last two positions
+        previous = self.previous_positions.get(entity)
+        if previous is None:
+            return scroll
+        dx = entity.position[0] - previous[0]
+        dy = entity.position[1] - previous[1]
+        if abs(dx) + abs(dy) > TELEPORT_DISTANCE:
+            return scroll
+        return (scroll[0] + dx * (1 - self.alpha), scroll[1] + dy * (1 - self.alpha))
+
+    def render_game(self):
+        scroll = self.interpolated_scroll()
+        # the margin covers the weakness icons drawn above and beside each enemy
+        visible_rect = self.view_rect(64)
+        for villager in self.villager_grid.query(visible_rect):
+            villager.render(self.display, self.render_offset(villager, scroll))
+        self.profiler.mark("entities")
+
+        self.tilemap.render(self.display, scroll)
+        self.profiler.mark("tilemap")
+        if not self.player.invincibility or self.player.invincibility % 10 == 0:
+            self.player.render(self.display, self.render_offset(self.player, scroll))
+
+        for projectile in self.projectiles:
+            projectile.render(self.display, self.render_offset(projectile, scroll))
+
+        for enemy in self.enemy_grid.query(visible_rect):
+            enemy.render(self.display, self.render_offset(enemy, scroll))
+        self.profiler.mark("entities")
+
+        self.display.blit(self.ui["spell/" + self.player.projectile_type], (16, 16))
+        self.display.blit(self.ui["staff"], (16, 16))
+        for heart in self.hearts:
+            self.display.blit(heart[0], heart[1])
+        for heart in self.heartless:
+            self.display.blit(heart[0], heart[1])
+        render_text(self.display, str(self.enemy_counter) + "/" + str(self.enemy_total), self.title_font, (255, 255, 255), (self.display.get_width() - 80, 16))
+        if self.yellow_key:
+            self.display.blit(self.ui["yellow_key"], (90, 48))
+        if self.red_key:
+            self.display.blit(self.ui["red_key"], (120, 48))
+
+    def render_game_over_screen(self):
         render_text(self.display, "Game Over!", self.title_font, (255, 255, 255), (self.display.get_width() / 3, self.display.get_height() / 2 - 50))
         render_text(self.display, "Press Space to go \nback to the title screen!", self.sub_title_font, (255, 255, 255), (self.display.get_width() / 3, self.display.get_height() / 2))
-        for event in pygame.event.get():
+
+    def game_over_screen(self):
+        for event in self.events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -226,12 +429,14 @@ class Game:
                 if event.key == pygame.K_SPACE:
                     self.on_title_screen = True
                     self.game_over = False
+        self.profiler.mark("events")
 
-    def victory_screen(self):
+    def render_victory_screen(self):
         render_text(self.display, "You Saved all the villagers!", self.title_font, (255, 255, 255), (self.display.get_width() / 6, self.display.get_height() / 2 - 50))
         render_text(self.display, "Press Space to go \nback to the title screen!", self.sub_title_font, (255, 255, 255), (self.display.get_width() / 3, self.display.get_height() / 2))
-        
-        for event in pygame.event.get():
+
+    def victory_screen(self):
+        for event in self.events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -240,21 +445,126 @@ class Game:
                 if event.key == pygame.K_SPACE:
                     self.on_title_screen = True
                     self.on_victory_screen = False
+        self.profiler.mark("events")
 
-    def run(self):
-        while True:
-            self.display.blit(self.assets["background"], (0, 0))
-            if self.on_title_screen:
-                self.title_screen()
-            elif self.on_game:
-                self.game_loop()
-            elif self.game_over:
-                self.game_over_screen()
-            elif self.on_victory_screen:
-                self.victory_screen()
-            
-            self.screen.blit(pygame.transform.scale(self.display, self.screen.get_size()), (0, 0))
-            pygame.display.update()
-            self.clock.tick(60)
+    def update(self):
+        if self.on_title_screen:
+            self.title_screen()
+        elif self.on_game:
+            self.game_loop()
+        elif self.game_over:
+            self.game_over_screen()
+        elif self.on_victory_screen:
+            self.victory_screen()
+
+    def render(self):
+        # the title, game over and victory screens don't change while they are up, so after their
+        # first frame there is nothing to redraw or present; returns whether the display changed
+        screen = (self.on_title_screen, self.on_game, self.game_over, self.on_victory_screen)
+        if screen == self.presented_screen:
+            return False
+        self.presented_screen = None if self.on_game or self.profiler.overlay else screen
+
+        self.display.blit(self.assets["background"], (0, 0))
+        self.profiler.mark("background")
+        if self.on_title_screen:
+            self.render_title_screen()
+        elif self.on_game:
+            self.render_game()
+        elif self.game_over:
+            self.render_game_over_screen()
+        elif self.on_victory_screen:
+            self.render_victory_screen()
+        self.profiler.mark("ui")
+        return True
+
+    def run(self, fps=60):
+        # the game logic always advances in STEP sized ticks of real time and rendering happens once
+        # per loop, capped at fps (0 for no cap); a slow frame is caught up with up to MAX_STEPS
+        # ticks before the next render, and any backlog beyond that is dropped
+        lag = 0
+        previous = time.perf_counter()
+        while self.playing:
+            self.profiler.begin_frame()
+            now = time.perf_counter()
+            lag += now - previous
+            previous = now
+            steps = 0
+            while lag >= STEP and steps < MAX_STEPS and self.playing:
+                self.remember_positions()
+                self.update()
+                lag -= STEP
+                steps += 1
+            if steps == MAX_STEPS:
+                lag = min(lag, STEP)
+            self.alpha = min(1, lag / STEP)
+            changed = self.render()
+            self.profiler.render(self.display)
+
+            if changed:
+                self.presenter.present()
+            self.profiler.mark("present")
+            self.clock.tick(fps)
+            self.profiler.mark("idle")
+            self.profiler.end_frame()
+
+    def simulate(self, frames):
+        start = time.perf_counter()
+        for _ in range(frames):
+            self.profiler.begin_frame()
+            self.update()
+            self.profiler.end_frame()
+        return frames / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--headless", action="store_true", help="step the game logic without a window, as fast as possible")
+    parser.add_argument("--frames", type=int, default=3600, help="number of frames to simulate in headless mode")
+    parser.add_argument("--script", help="input script to replay in headless mode")
+    parser.add_argument("--level", default="data/map.json", help="level to play, either map.json or a packed .bin level")
+    parser.add_argument("--stream", action="store_true", help="page chunks of a .bin level in around the camera")
+    parser.add_argument("--batched-physics", action="store_true", help="step enemies and villagers together with NumPy")
+    parser.add_argument("--profile-csv", help="write per-frame stage timings in milliseconds to this CSV file")
+    parser.add_argument("--activity-margin", type=int, default=480, help="enemies and villagers further than this many pixels outside the view are frozen")
+    parser.add_argument("--window", type=int, nargs=2, default=(960, 540), metavar=("WIDTH", "HEIGHT"), help="window size, the 480x270 display is scaled to fit")
+    parser.add_argument("--seed", type=int, help="seed for the game's random choices")
+    parser.add_argument("--record", help="record every frame's input and periodic state hashes to this file")
+    parser.add_argument("--replay", help="play back a recording made with --record and check its state hashes")
+    parser.add_argument("--checkpoints", action="store_true", help="respawn at the last rescued villager instead of ending the game")
+    parser.add_argument("--uncapped", action="store_true", help="render as often as possible instead of at most 60 fps, the game logic still runs at 60 Hz")
+    args = parser.parse_args()
+    if args.stream and not is_level_file(args.level):
+        parser.error("--stream pages chunks of a packed " + LEVEL_EXTENSION + " level, " + args.level + " is not one")
+
+    options = {"level": args.level, "stream": args.stream, "batched_physics": args.batched_physics, "activity_margin": args.activity_margin, "seed": args.seed, "checkpoints": args.checkpoints}
+    if args.headless:
+        game = Game(headless=True, **options)
+        game.input_source = load_script(args.script) if args.script else default_script()
+    else:
+        game = Game(window_size=tuple(args.window), **options)
+    frames = args.frames
+    if args.replay:
+        game.input_source = InputReplay(game, args.replay)
+        frames = game.input_source.length
+    if args.record:
+        game.input_source = InputRecorder(game, args.record, game.input_source)
+        atexit.register(game.input_source.close)
+    if args.profile_csv:
+        game.profiler.export_csv(args.profile_csv)
+        atexit.register(game.profiler.close)
+
+    if args.headless:
+        fps = game.simulate(frames)
+        game.profiler.close()
+        print(str(frames) + " frames, " + str(round(fps)) + " simulated fps (" + str(round(fps / 60, 1)) + "x real time)")
+        for stage, samples in game.profiler.samples.items():
+            print(stage.ljust(12) + " p50/p95/p99 " + " / ".join(str(round(value * 1000, 3)) for value in game.profiler.percentiles(stage)) + " ms")
+    else:
+        game.run(0 if args.uncapped else 60)
 
-Game().run()
\ No newline at end of file
+    if args.replay:
+        mismatches = game.input_source.mismatches
+        print(str(len(game.input_source.checkpoints)) + " checkpoints, " + str(len(mismatches)) + " mismatched")
+        if mismatches:
+            print("first desync at frame " + str(mismatches[0][0]))
+            sys.exit(1)
@@ -0,0 +1,130 @@
+import os, sys, json, time, argparse, statistics, traceback, multiprocessing
+
+from game import Game
+from scripts.inputs import load_script, default_script, RandomInput, SeekInput
+
+POLICIES = ("script", "random", "seek")
+
+def input_policy(game, policy, seed):
+    # "script" replays the default script, "script:path" a script file, "random" mashes keys and
+    # "seek" plays the level through, enemy by enemy
+    if policy == "script":
+        return default_script()
+    if policy.startswith("script:"):
+        return load_script(policy[len("script:"):])
+    if policy == "random":
+        return RandomInput(seed)
+    if policy == "seek":
+        return SeekInput(game, seed)
+    raise ValueError("unknown input policy " + policy)
+
+def percentile(ordered, rank):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * rank))]
+
+def playtest(job):
+    level, seed, policy, frames = job
+    result = {"level": level, "seed": seed, "policy": policy, "frames": 0, "outcome": "timeout", "error": None}
+    times = []
+    try:
+        # the seed picks every weakness colour, so each run faces a different set of enemies
+        game = Game(headless=True, level=level, seed=seed)
+        game.input_source = input_policy(game, policy, seed)
+        for frame in range(frames):
+            start = time.perf_counter()
+            game.update()
+            times.append(time.perf_counter() - start)
+            if game.on_victory_screen:
+                result["outcome"] = "clear"
+                break
+            if game.game_over:
+                result["outcome"] = "death"
+                break
+        result["frames"] = len(times)
+    except Exception:
+        result["outcome"] = "crash"
+        result["frames"] = len(times)
+        result["error"] = traceback.format_exc().strip().split("\n")[-1]
+    if times:
+        times.sort()
+        result["frame_ms"] = [round(value * 1000, 4) for value in (percentile(times, 0.5), percentile(times, 0.95), percentile(times, 0.99), times[-1])]
+    return result
+
+def summarize(runs):
+    outcomes = [run["outcome"] for run in runs]
+    clears = [run["frames"] / 60 for run in runs if run["outcome"] == "clear"]
+    timed = [run["frame_ms"] for run in runs if "frame_ms" in run]
+    crashes = {}
+    for run in runs:
+        if run["error"]:
+            crashes[run["error"]] = crashes.get(run["error"], 0) + 1
+    summary = {
+        "runs": len(runs),
+        "completion_rate": outcomes.count("clear") / len(runs),
+        "deaths": outcomes.count("death"),
+        "timeouts": outcomes.count("timeout"),
+        "crashes": outcomes.count("crash"),
+        "crash_messages": crashes,
+        "time_to_clear_s": {"median": statistics.median(clears), "min": min(clears), "max": max(clears)} if clears else None,
+    }
+    if timed:
+        summary["frame_ms"] = {
+            "p50": statistics.median(times[0] for times in timed),
+            "p95": statistics.median(times[1] for times in timed),
+            "p99": statistics.median(times[2] for times in timed),
+            "max": max(times[3] for times in timed),
+        }
+    return summary
+
+def sweep(levels, runs, policies, frames, workers, base_seed=0):
+    # every level gets runs seeds, each played once per policy
+    jobs = [(level, base_seed + run, policy, frames) for level in levels for run in range(runs) for policy in policies]
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers) as pool:
+        results = list(pool.imap_unordered(playtest, jobs, chunksize=max(1, len(jobs) // (workers * 8))))
+        # SDL turns SIGTERM into a quit event, so a worker that has started a game ignores
+        # Pool.terminate; let them run out of work and exit instead
+        pool.close()
+        pool.join()
+    wall = time.perf_counter() - start
+
+    summaries = {}
+    for level in levels:
+        for policy in policies:
+            level_runs = [result for result in results if result["level"] == level and result["policy"] == policy]
+            summaries[level + " " + policy] = summarize(level_runs)
+    return {"workers": workers, "wall_s": wall, "runs_per_minute": len(jobs) / wall * 60, "levels": summaries, "results": results}
+
+def report(sweep_results):
+    print("level / policy".ljust(32) + "runs".rjust(6) + "clear".rjust(8) + "deaths".rjust(8) + "timeout".rjust(9) + "crash".rjust(7) + "clear s".rjust(9) + "p50 ms".rjust(9) + "p99 ms".rjust(9) + "max ms".rjust(9))
+    for name, summary in sweep_results["levels"].items():
+        clear_time = summary["time_to_clear_s"]["median"] if summary["time_to_clear_s"] else None
+        frame_ms = summary.get("frame_ms", {})
+        print(
+            name.ljust(32) + str(summary["runs"]).rjust(6) + (str(round(summary["completion_rate"] * 100)) + "%").rjust(8)
+            + str(summary["deaths"]).rjust(8) + str(summary["timeouts"]).rjust(9) + str(summary["crashes"]).rjust(7)
+            + ("-" if clear_time is None else str(round(clear_time, 1))).rjust(9)
+            + "".join(("-" if key not in frame_ms else str(round(frame_ms[key], 2))).rjust(9) for key in ("p50", "p99", "max"))
+        )
+        for message, count in summary["crash_messages"].items():
+            print("    " + str(count) + "x " + message)
+    print(str(sum(summary["runs"] for summary in sweep_results["levels"].values())) + " runs on " + str(sweep_results["workers"]) + " workers in "
+          + str(round(sweep_results["wall_s"], 1)) + "s (" + str(round(sweep_results["runs_per_minute"])) + " runs/minute)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play levels headlessly many times in parallel and report how the runs went.")
+    parser.add_argument("--levels", nargs="+", default=["data/map.json"], help="levels to play, map.json or packed .bin files")
+    parser.add_argument("--runs", type=int, default=100, help="seeds to play per level and policy")
+    parser.add_argument("--policies", nargs="+", default=["seek"], help="input policies: script, script:path, random or seek")
+    parser.add_argument("--frames", type=int, default=7200, help="frames before a run counts as a timeout")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes, all cores by default")
+    parser.add_argument("--seed", type=int, default=0, help="first seed, runs use seed, seed + 1, ...")
+    parser.add_argument("--output", help="also write the summaries and every run's result to this JSON file")
+    args = parser.parse_args()
+
+    results = sweep(args.levels, args.runs, args.policies, args.frames, args.workers, args.seed)
+    report(results)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if any(summary["crashes"] for summary in results["levels"].values()):
+        sys.exit(1)
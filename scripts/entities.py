@@ -1,8 +1,9 @@
-import pygame, random
+import pygame
 from scripts.projectile import Projectile
-from scripts.utils import load_image
 COLORS = ("blue", "pink")
 class PhysicsEntity:
+    __slots__ = ("game", "type", "position", "collisions", "size", "velocity", "flip", "health", "wait", "action", "world", "row", "animation")
+
     def __init__(self, game, entity_type, position, size, health) -> None:
         self.game = game
         self.type = entity_type
@@ -14,6 +15,8 @@ class PhysicsEntity:
         self.health = health
         self.wait = False
         self.action = ""
+        self.world = None
+        self.row = None
 
     def rect(self):
         return pygame.Rect(self.position[0], self.position[1], self.size[0], self.size[1])
@@ -24,7 +27,22 @@ class PhysicsEntity:
             self.animation = self.game.assets[self.type + "/" + self.action].copy()
 
     def update(self, movement=(0,0)) -> None:
-        self.collisions = {'up': False, 'down': False, 'right': False, 'left': False}
+        if self.velocity[0]:
+            # dashes are the only horizontal velocity; sweeping them stops fast bodies at the first
+            # wall on the way instead of relying on the neighbourhood check below
+            frame_x = movement[0] + self.velocity[0]
+            allowed = self.game.tilemap.sweep(self.rect(), frame_x, 0)
+            if allowed != frame_x:
+                self.velocity[0] = 0
+                movement = (allowed, movement[1])
+
+        if self.world is not None:
+            # batched bodies are stepped together by PhysicsWorld.step, which is followed by finish_update
+            self.world.queue(self, movement)
+            return
+
+        collisions = self.collisions
+        collisions['up'] = collisions['down'] = collisions['right'] = collisions['left'] = False
         frame_movement = (movement[0] + self.velocity[0], movement[1] + self.velocity[1])
         
         if not self.wait:
@@ -64,14 +82,18 @@ class PhysicsEntity:
         if self.collisions["right"] or self.collisions["left"]:
             self.velocity[0] = 0
 
+        self.finish_update()
+
+    def finish_update(self) -> None:
+        if self.world is not None:
+            self.flip = bool(self.world.flips[self.row])
         self.animation.update()
 
     def render(self, surface, offset) -> None:
-        if self.flip:
-            surface.blit(pygame.transform.flip(self.animation.img(), True, False), (self.position[0] - offset[0], self.position[1] - offset[1]))
-        else:
-            surface.blit(self.animation.img(), (self.position[0] - offset[0], self.position[1] - offset[1]))
+        surface.blit(self.animation.img(self.flip), (self.position[0] - offset[0], self.position[1] - offset[1]))
 class Player(PhysicsEntity):
+    __slots__ = ("health_maximum", "projectile_type", "invincibility", "shoot_cooldown", "air_time", "jump_cap", "jumps")
+
     def __init__(self, game, position, size, health) -> None:
         super().__init__(game, "player", position, size, health)
         self.health_maximum = health
@@ -145,7 +167,7 @@ class Player(PhysicsEntity):
             self.game.hearts.pop()
             if len(self.game.hearts) <= 0:
                 break
-            self.game.heartless.append((load_image("ui/heartless.png"), (self.game.hearts[len(self.game.hearts) - 1][1][0] + 30, 16)))
+            self.game.heartless.append((self.game.ui["heartless"], (self.game.hearts[len(self.game.hearts) - 1][1][0] + 30, 16)))
                 
     def switch_colors(self) -> None:
         self.game.sfx["switch"].play()
@@ -159,10 +181,12 @@ class Player(PhysicsEntity):
         self.health = self.health_maximum
         self.game.hearts.clear()
         for i in range(self.health):
-            self.game.hearts.append((load_image("ui/heart.png"), (80 + 30 * i, 16)))
+            self.game.hearts.append((self.game.ui["heart"], (80 + 30 * i, 16)))
         self.game.heartless.clear()
 
 class Weakness:
+    __slots__ = ("game", "position", "count", "size", "type", "animation")
+
     def __init__(self, game, position, size, count) -> None:
         self.game = game
         if count == 0:
@@ -171,7 +195,7 @@ class Weakness:
             self.position = [position[0] - 16 + (size[0] + 10) * count, position[1] - 30]
         self.count = count
         self.size = size
-        self.type = random.choice(COLORS)
+        self.type = game.random.choice(COLORS)
         self.animation = self.game.assets["weakness/" + self.type]
 
     def update(self, enemy_position, flip) -> None:
@@ -199,6 +223,8 @@ class Weakness:
     def render(self, surface, offset) -> None:
         surface.blit(self.animation.img(), (self.position[0] - offset[0], self.position[1] - offset[1]))
 class Enemy(PhysicsEntity):
+    __slots__ = ("id", "weaknesses", "auxiliar_weaknesses", "boundaries", "stunned", "attack_cooldown", "chase_direction")
+
     def __init__(self, id, game, position, size, health=3) -> None:
         super().__init__(game, "enemy", position, size, health)
         self.id = id
@@ -213,11 +239,13 @@ class Enemy(PhysicsEntity):
         self.boundaries = (-100, 100)
         self.stunned = False
         self.attack_cooldown = 0
+        self.chase_direction = 0
 
         self.set_action("idle")
 
     def update(self, movement=[0, 0]) -> None:
-        if not self.attack_cooldown and self.position[1] == self.game.player.position[1]:
+        player = self.game.player
+        if not self.attack_cooldown and self.position[1] == player.position[1] and self.sees(player):
             if self.position[0] > self.game.player.position[0] and self.position[0] - self.game.player.position[0] - self.game.player.size[0] < 260:
                 movement[0] = -1
                 self.set_action("chase")
@@ -231,12 +259,37 @@ class Enemy(PhysicsEntity):
             else:
                 movement[0] = 0
                 self.set_action("idle")
+        elif not self.attack_cooldown and abs(self.position[0] - player.position[0]) < 260 and abs(self.position[1] - player.position[1]) < 200:
+            # the player is on another level, so follow the navigation graph across platforms
+            navigation = self.game.navigation
+            rect = self.rect()
+            start = navigation.standing_cell(rect)
+            if start is None:
+                # keep going the same way through a jump or a drop
+                movement[0] = self.chase_direction
+            else:
+                movement[0], jump = navigation.next_step(start, rect, player.rect())
+                if jump:
+                    self.velocity[1] = -navigation.jump_velocity
+            self.set_action("chase" if movement[0] else "idle")
         else:
             movement[0] = 0
-            
+        self.chase_direction = movement[0]
 
         super().update(movement)
 
+    def sees(self, entity):
+        # line of sight between eye heights, only worth casting within chasing distance
+        if abs(self.position[0] - entity.position[0]) > 320:
+            return False
+        eye = self.size[1] / 4
+        return self.game.tilemap.raycast(
+            (self.position[0] + self.size[0] / 2, self.position[1] + eye),
+            (entity.position[0] + entity.size[0] / 2, entity.position[1] + eye),
+        ) is None
+
+    def finish_update(self) -> None:
+        super().finish_update()
         if self.attack_cooldown:
             self.attack_cooldown -= 1
             if self.attack_cooldown == 60:
@@ -279,6 +332,8 @@ class Enemy(PhysicsEntity):
         
 
 class Villager (PhysicsEntity):
+    __slots__ = ()
+
     def __init__(self, game, position, size) -> None:
         super().__init__(game, "villager", position, size, 1)
         self.set_action("idle")
@@ -0,0 +1,286 @@
+import pygame, random, struct
+from scripts.tilemap import MAGIC_COLORS
+from scripts.navigation import PlayerNavGraph
+
+EVENT_TYPES = {"down": pygame.KEYDOWN, "up": pygame.KEYUP}
+
+class ScriptedInput:
+    def __init__(self, script, length=None) -> None:
+        self.script = script
+        self.length = length
+        self.frame = 0
+
+    def get(self):
+        frame = self.frame if self.length is None else self.frame % self.length
+        events = [pygame.event.Event(event_type, key=key) for event_type, key in self.script.get(frame, ())]
+        self.frame += 1
+        pygame.event.pump()
+        return events
+
+def load_script(path):
+    # one "frame,down|up,key name" entry per line, e.g. "12,down,space"
+    script = {}
+    length = 0
+    with open(path, "r") as file:
+        for line in file.read().split("\n"):
+            if not line.strip() or line.startswith("#"):
+                continue
+            frame, event_type, key = line.split(",")
+            script.setdefault(int(frame), []).append((EVENT_TYPES[event_type.strip()], pygame.key.key_code(key.strip())))
+            length = max(length, int(frame) + 1)
+    return ScriptedInput(script, length)
+
+def default_script():
+    script = {}
+    def press(frame, key, hold=1):
+        script.setdefault(frame, []).append((pygame.KEYDOWN, key))
+        script.setdefault(frame + hold, []).append((pygame.KEYUP, key))
+
+    press(0, pygame.K_SPACE)
+    press(1, pygame.K_RIGHT, 400)
+    press(420, pygame.K_LEFT, 100)
+    press(540, pygame.K_RIGHT, 400)
+    for frame in range(10, 960, 45):
+        press(frame, pygame.K_SPACE)
+    for frame in range(25, 960, 30):
+        press(frame, pygame.K_f)
+    for frame in range(200, 960, 240):
+        press(frame, pygame.K_d)
+    return ScriptedInput(script, 960)
+
+RECORDING_MAGIC = b"CWIR"
+RECORDING_VERSION = 1
+RECORDING_HEADER = struct.Struct("<4sHIII")
+RECORD = struct.Struct("<BIQ")
+KEY_DOWN, KEY_UP, QUIT, CHECKPOINT = range(4)
+RECORD_KINDS = {pygame.KEYDOWN: KEY_DOWN, pygame.KEYUP: KEY_UP, pygame.QUIT: QUIT}
+
+# layout: header (magic, version, seed, checkpoint interval, frame count), then (kind, frame, value)
+# records where value is the key code for key events and Game.state_hash() for checkpoints
+
+class InputRecorder:
+    def __init__(self, game, path, source=None, checkpoint_interval=60) -> None:
+        self.game = game
+        self.source = source
+        self.checkpoint_interval = checkpoint_interval
+        self.frame = 0
+        self.file = open(path, "wb")
+        self.file.write(RECORDING_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, game.seed, checkpoint_interval, 0))
+
+    def get(self):
+        if self.frame % self.checkpoint_interval == 0:
+            self.file.write(RECORD.pack(CHECKPOINT, self.frame, self.game.state_hash()))
+        events = self.source.get() if self.source else pygame.event.get()
+        for event in events:
+            if event.type in RECORD_KINDS:
+                self.file.write(RECORD.pack(RECORD_KINDS[event.type], self.frame, getattr(event, "key", 0)))
+        self.frame += 1
+        return events
+
+    def close(self):
+        if not self.file.closed:
+            self.file.seek(0)
+            self.file.write(RECORDING_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, self.game.seed, self.checkpoint_interval, self.frame))
+            self.file.close()
+
+def read_recording(path):
+    with open(path, "rb") as file:
+        data = file.read()
+    magic, version, seed, checkpoint_interval, length = RECORDING_HEADER.unpack_from(data, 0)
+    if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+        raise ValueError(str(path) + " is not a version " + str(RECORDING_VERSION) + " input recording")
+    events = {}
+    checkpoints = {}
+    quit_frame = None
+    for kind, frame, value in RECORD.iter_unpack(data[RECORDING_HEADER.size:]):
+        if kind == CHECKPOINT:
+            checkpoints[frame] = value
+        elif kind == QUIT:
+            quit_frame = frame
+        else:
+            events.setdefault(frame, []).append(pygame.event.Event(pygame.KEYDOWN if kind == KEY_DOWN else pygame.KEYUP, key=value))
+        # a recording cut short by a crash still has its records, just not the final frame count
+        length = max(length, frame + 1)
+    # the replay stops where the window was closed instead of quitting the game
+    if quit_frame is not None:
+        length = quit_frame
+    return seed, events, checkpoints, length
+
+class InputReplay:
+    # feeds a recording back one frame per call and compares Game.state_hash() at each checkpoint
+    def __init__(self, game, path) -> None:
+        self.game = game
+        self.seed, self.events, self.checkpoints, self.length = read_recording(path)
+        game.seed = self.seed
+        game.random.seed(self.seed)
+        self.frame = 0
+        self.mismatches = []
+
+    def get(self):
+        expected = self.checkpoints.get(self.frame)
+        if expected is not None:
+            actual = self.game.state_hash()
+            if actual != expected:
+                self.mismatches.append((self.frame, expected, actual))
+        events = self.events.get(self.frame, [])
+        self.frame += 1
+        if self.frame >= self.length:
+            self.game.playing = False
+        pygame.event.pump()
+        return events
+
+class RandomInput:
+    # starts the game, then presses or releases one of the game's keys now and then, leaning right
+    KEYS = (pygame.K_RIGHT, pygame.K_RIGHT, pygame.K_LEFT, pygame.K_SPACE, pygame.K_SPACE, pygame.K_f, pygame.K_f, pygame.K_d)
+
+    def __init__(self, seed, rate=0.08) -> None:
+        self.random = random.Random(seed)
+        self.rate = rate
+        self.frame = 0
+        self.held = set()
+
+    def press(self, events, key):
+        if key in self.held:
+            self.held.discard(key)
+            events.append(pygame.event.Event(pygame.KEYUP, key=key))
+        else:
+            self.held.add(key)
+            events.append(pygame.event.Event(pygame.KEYDOWN, key=key))
+
+    def get(self):
+        events = []
+        if self.frame == 0:
+            events.append(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_SPACE))
+        elif self.random.random() < self.rate:
+            self.press(events, self.random.choice(self.KEYS))
+        self.frame += 1
+        pygame.event.pump()
+        return events
+
+class SeekInput(RandomInput):
+    # heads for the nearest enemy it can reach on a navigation graph of the player's own moves,
+    # switching colours so magic tiles hold it up and stay out of its way, and shoots once the staff
+    # holds the colour of the enemy's next weakness
+    def __init__(self, game, seed) -> None:
+        super().__init__(seed)
+        self.game = game
+        # the player runs at 3.5 px a frame and can run most of its width past an edge before it jumps
+        self.navigation = PlayerNavGraph(game.tilemap, (48, 64), speed=3.5, max_cost=36000, overhang=40)
+        self.direction = 0
+        self.hop = None
+        self.last_x = None
+        self.switched = 0
+
+    def hold(self, events, key, down):
+        if down != (key in self.held):
+            self.press(events, key)
+
+    def color(self, cell):
+        tile = self.game.tilemap.get_tile(*cell)
+        return MAGIC_COLORS.get(tile.type) if tile else None
+
+    def overlaps(self, rect, color):
+        # a tile of color inside rect, which would shove the player aside if that colour turned solid
+        size = self.game.tilemap.size
+        for x in range(rect.left // size, (rect.right - 1) // size + 1):
+            for y in range(rect.top // size, (rect.bottom - 1) // size + 1):
+                if self.color((x, y)) == color:
+                    return True
+        return False
+
+    def blocked(self, start, end):
+        # a solid magic tile in the space a hop from start to end passes through
+        for x in range(min(start[0], end[0]), max(start[0], end[0]) + 1):
+            for y in range(min(start[1], end[1]) - self.navigation.clearance - 1, max(start[1], end[1])):
+                if self.color((x, y)) and self.game.tilemap.is_solid(x, y):
+                    return True
+        return False
+
+    def switch(self, events):
+        player = self.game.player
+        if not self.switched and not self.game.tilemap.check_tile(player.position, player.size[1]) in {"pink_border", "blue_border"}:
+            events.append(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_d))
+            self.switched = 8
+
+    def get(self):
+        events = []
+        game = self.game
+        self.frame += 1
+        pygame.event.pump()
+        if not game.on_game:
+            if self.frame % 2 == 0:
+                events.append(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_SPACE))
+            return events
+
+        navigation = self.navigation
+        navigation.update()
+        tilemap = game.tilemap
+        player = game.player
+        rect = player.rect()
+        if self.switched:
+            self.switched -= 1
+        start = navigation.standing_cell(rect) if player.collisions["down"] else None
+        if start is None:
+            # in the air: steer over the cell the hop lands on and make it solid just before landing
+            direction = self.direction
+            if self.hop is not None:
+                left, right = self.hop[0] * tilemap.size, (self.hop[0] + 1) * tilemap.size
+                if rect.left >= left - 8 and rect.right <= right + 8:
+                    direction = 0
+                else:
+                    direction = 1 if rect.centerx < left + tilemap.size / 2 else -1
+                color = self.color(self.hop)
+                if color and not tilemap.is_solid(*self.hop) and not self.overlaps(rect.inflate(12, 12), color):
+                    self.switch(events)
+            self.hold(events, pygame.K_RIGHT, direction > 0)
+            self.hold(events, pygame.K_LEFT, direction < 0)
+            return events
+
+        self.hop = None
+        nearest = None
+        for enemy in game.enemies:
+            target = navigation.target_cell(enemy.rect())
+            if target is None or target != start and start not in navigation.route(target):
+                continue
+            distance = abs(target[0] - start[0]) + abs(target[1] - start[1])
+            if nearest is None or distance < nearest[0]:
+                nearest = (distance, enemy, target)
+
+        direction, jump = 0, False
+        if nearest is not None:
+            distance, enemy, target = nearest
+            dx = enemy.rect().centerx - rect.centerx
+            dy = enemy.rect().centery - rect.centery
+            if abs(dx) < 250 and abs(dy) < 40 and tilemap.raycast(rect.center, enemy.rect().center) is None:
+                if (dx < 0) != player.flip:
+                    direction = 1 if dx > 0 else -1
+                elif player.projectile_type != enemy.weaknesses[0].type:
+                    # switching on a magic tile would drop the player through it
+                    if not self.color(start):
+                        self.switch(events)
+                elif not player.shoot_cooldown:
+                    events.append(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_f))
+            elif target != start:
+                cell = navigation.route(target)[start][0]
+                direction, jump = navigation.next_step(start, rect, enemy.rect())
+                if self.blocked(start, cell) and not self.color(start) and not self.color(cell):
+                    self.switch(events)
+                    jump = False
+                if jump:
+                    self.hop = cell
+                # a wall the graph doesn't see, like a door or a magic tile of the solid colour, is jumped
+                if direction and direction == self.direction and player.position[0] == self.last_x:
+                    jump = True
+                    self.hop = cell
+        elif game.enemies:
+            # nothing is reachable yet, e.g. while the yellow door is shut, so head for the nearest one
+            enemy = min(game.enemies, key=lambda enemy: abs(enemy.position[0] - player.position[0]))
+            direction = 1 if enemy.position[0] > player.position[0] else -1
+
+        self.last_x = player.position[0]
+        self.direction = direction
+        self.hold(events, pygame.K_RIGHT, direction > 0)
+        self.hold(events, pygame.K_LEFT, direction < 0)
+        if jump:
+            events.append(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_SPACE))
+        return events
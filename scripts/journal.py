@@ -0,0 +1,145 @@
+import os, json
+from concurrent.futures import ThreadPoolExecutor
+from scripts.tilemap import Tile
+
+JOURNAL_EXTENSION = ".journal"
+
+def write_atomic(path, data):
+    # a crash mid-write leaves the old file in place instead of a truncated one
+    temporary = path + ".tmp"
+    with open(temporary, "wb" if isinstance(data, bytes) else "w") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+class MapJournal:
+    # edits are appended to <map>.journal as they happen, one JSON array per line starting with a
+    # sequence number; every compact_every entries the whole map is rewritten and the journal emptied.
+    # The map file stores the last sequence number it contains, so replaying after a crash at any
+    # point skips entries that already made it into the map. The writer thread keeps its own copy of
+    # the map data, loaded from the file and kept up to date from the journal entries it writes, so
+    # a compaction costs the editor nothing however large the map is.
+    def __init__(self, tilemap, path, compact_every=500) -> None:
+        self.tilemap = tilemap
+        self.path = path
+        self.journal_path = path + JOURNAL_EXTENSION
+        self.compact_every = compact_every
+        self.sequence = tilemap.journal_sequence
+        self.pending = []
+        self.since_compaction = 0
+        self.map_data = None
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="map-journal")
+        self.writer.submit(self.load_map_data)
+        self.replay()
+        self.tilemap.journal = self
+
+    def read_journal(self, sequence):
+        # entries after sequence, skipping the last line of a journal cut off by a crash
+        if not os.path.exists(self.journal_path):
+            return []
+        with open(self.journal_path, "r") as file:
+            lines = file.read().split("\n")
+        entries = []
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry[0] > sequence:
+                entries.append(entry)
+        return entries
+
+    def replay(self):
+        for entry in self.read_journal(self.sequence):
+            self.sequence = entry[0]
+            self.since_compaction += 1
+            self.apply(entry[1:])
+
+    def load_map_data(self):
+        # writer thread: the same map and journal the editor starts from, as plain map data
+        try:
+            with open(self.path, "r") as file:
+                self.map_data = json.load(file)
+        except FileNotFoundError:
+            self.map_data = {"tilemap": {}, "tile_size": self.tilemap.size, "offgrid": [], "journal_sequence": 0}
+        self.apply_map_data(self.read_journal(self.map_data.get("journal_sequence", 0)))
+
+    def apply_map_data(self, entries):
+        tilemap = self.map_data["tilemap"]
+        offgrid = self.map_data["offgrid"]
+        for entry in entries:
+            sequence, kind = entry[0], entry[1]
+            if kind == "set":
+                tilemap[str(entry[2]) + ";" + str(entry[3])] = {"type": entry[4], "variant": entry[5], "pos": [entry[2], entry[3]]}
+            elif kind == "remove":
+                tilemap.pop(str(entry[2]) + ";" + str(entry[3]), None)
+            elif kind == "offgrid_add":
+                offgrid.append({"type": entry[2], "variant": entry[3], "pos": [entry[4], entry[5]]})
+            elif kind == "offgrid_remove":
+                tile = {"type": entry[2], "variant": entry[3], "pos": [entry[4], entry[5]]}
+                if tile in offgrid:
+                    offgrid.remove(tile)
+            self.map_data["journal_sequence"] = sequence
+
+    def apply(self, entry):
+        kind = entry[0]
+        if kind == "set":
+            self.tilemap.edit([(entry[1], entry[2], entry[3], entry[4])])
+        elif kind == "remove":
+            self.tilemap.edit([(entry[1], entry[2], None, 0)])
+        elif kind == "offgrid_add":
+            self.tilemap.add_offgrid(Tile(entry[1], entry[2], (entry[3], entry[4])))
+        elif kind == "offgrid_remove":
+            for tile in self.tilemap.offgrid_at((entry[3], entry[4])):
+                if (tile.type, tile.variant, tile.pos) == (entry[1], entry[2], (entry[3], entry[4])):
+                    self.tilemap.remove_offgrid(tile)
+                    break
+
+    def log(self, *entry):
+        self.sequence += 1
+        self.pending.append([self.sequence] + list(entry))
+
+    def log_tiles(self, changes):
+        for x, y, tile_type, variant in changes:
+            if tile_type is None:
+                self.log("remove", x, y)
+            else:
+                self.log("set", x, y, tile_type, variant)
+
+    def flush(self):
+        # called once a frame: hands the new entries to the writer thread
+        if not self.pending:
+            return
+        self.since_compaction += len(self.pending)
+        self.writer.submit(self.append, self.pending)
+        self.pending = []
+        if self.since_compaction >= self.compact_every:
+            self.compact()
+
+    def append(self, entries):
+        # writer thread, like everything below
+        with open(self.journal_path, "a") as file:
+            file.write("".join(json.dumps(entry) + "\n" for entry in entries))
+            file.flush()
+            os.fsync(file.fileno())
+        self.apply_map_data(entries)
+
+    def compact(self):
+        # the writer thread rewrites the map from its own copy once every earlier entry is applied,
+        # so this only hands over the entries still pending
+        if self.pending:
+            self.writer.submit(self.append, self.pending)
+            self.pending = []
+        self.tilemap.journal_sequence = self.sequence
+        self.since_compaction = 0
+        self.writer.submit(self.write_map)
+
+    def write_map(self):
+        write_atomic(self.path, json.dumps(self.map_data))
+        write_atomic(self.journal_path, "")
+
+    def close(self):
+        self.compact()
+        self.writer.shutdown(wait=True)
+        self.tilemap.journal = None
@@ -0,0 +1,116 @@
+import mmap, struct, sys
+
+LEVEL_EXTENSION = ".bin"
+MAGIC = b"CWLV"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIII")
+CHUNK_ENTRY = struct.Struct("<iiII")
+TILE = struct.Struct("<iiHH")
+OFFGRID_TILE = struct.Struct("<ffHH")
+
+# layout: header, type string table (u8 length + utf-8), chunk directory,
+# tiles grouped by chunk as (x, y, type id, variant), then off-grid tiles
+
+def is_level_file(path):
+    return str(path).endswith(LEVEL_EXTENSION)
+
+def save_level(tilemap, path):
+    types = {}
+    def type_id(tile_type):
+        if tile_type not in types:
+            types[tile_type] = len(types)
+        return types[tile_type]
+
+    directory = bytearray()
+    tiles = bytearray()
+    tile_count = 0
+    for chunk in tilemap.chunks.values():
+        first = tile_count
+        for tile in chunk.tiles:
+            if tile is not None:
+                tiles += TILE.pack(tile.pos[0], tile.pos[1], type_id(tile.type), tile.variant)
+                tile_count += 1
+        directory += CHUNK_ENTRY.pack(chunk.position[0], chunk.position[1], first, tile_count - first)
+
+    offgrid = bytearray()
+    for tile in tilemap.offgrid_tiles:
+        offgrid += OFFGRID_TILE.pack(tile.pos[0], tile.pos[1], type_id(tile.type), tile.variant)
+
+    table = bytearray()
+    for tile_type in types:
+        name = tile_type.encode("utf-8")
+        table += bytes((len(name),)) + name
+
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, tilemap.size, len(types), len(tilemap.chunks), tile_count, len(tilemap.offgrid_tiles)))
+        file.write(table)
+        file.write(directory)
+        file.write(tiles)
+        file.write(offgrid)
+
+class LevelFile:
+    def __init__(self, path) -> None:
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.data)
+
+        magic, version, self.tile_size, type_count, chunk_count, tile_count, offgrid_count = HEADER.unpack_from(self.view, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(str(path) + " is not a version " + str(VERSION) + " level file")
+
+        offset = HEADER.size
+        self.types = []
+        for _ in range(type_count):
+            length = self.view[offset]
+            self.types.append(bytes(self.view[offset + 1:offset + 1 + length]).decode("utf-8"))
+            offset += 1 + length
+
+        self.directory = {}
+        self.tiles = offset + chunk_count * CHUNK_ENTRY.size
+        for chunk_x, chunk_y, first, count in CHUNK_ENTRY.iter_unpack(self.view[offset:self.tiles]):
+            self.directory[(chunk_x, chunk_y)] = (first, count)
+        self.offgrid_start = self.tiles + tile_count * TILE.size
+        self.offgrid_count = offgrid_count
+
+    def records(self, position):
+        # (x, y, type id, variant) for every tile of one chunk, read straight from the mapping
+        first, count = self.directory[position]
+        start = self.tiles + first * TILE.size
+        return list(TILE.iter_unpack(self.view[start:start + count * TILE.size]))
+
+    def offgrid_tiles(self):
+        tiles = []
+        end = self.offgrid_start + self.offgrid_count * OFFGRID_TILE.size
+        for x, y, tile_type, variant in OFFGRID_TILE.iter_unpack(self.view[self.offgrid_start:end]):
+            tiles.append({"type": self.types[tile_type], "variant": variant, "pos": [x, y]})
+        return tiles
+
+    def close(self):
+        self.view.release()
+        self.data.close()
+        self.file.close()
+
+def load_level(tilemap, path):
+    level = LevelFile(path)
+    try:
+        tilemap.chunks = {}
+        tilemap.type_index = {}
+        tilemap.size = level.tile_size
+        for position in level.directory:
+            tilemap.load_chunk(position, level.records(position), level.types)
+        tilemap.set_offgrid(level.offgrid_tiles())
+    finally:
+        level.close()
+
+def convert(source, destination):
+    from scripts.tilemap import Tilemap
+    tilemap = Tilemap(None)
+    tilemap.load(source)
+    tilemap.save(destination)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("usage: python -m scripts.level <source> <destination>  (.json <-> " + LEVEL_EXTENSION + ")")
+        sys.exit(1)
+    convert(sys.argv[1], sys.argv[2])
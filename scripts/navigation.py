@@ -0,0 +1,227 @@
+import math, heapq, bisect
+from collections import OrderedDict
+from scripts.tilemap import CHUNK_SIZE, MAGIC_COLORS
+
+class NavGraph:
+    # nodes are standing cells, a solid tile with room for the entity above it, joined by walk,
+    # drop and jump links worked out from the jump velocity and gravity. It is built once and patched
+    # in bands of rows around the tiles and chunks that change; each target cell gets one cached
+    # table of next hops that every chaser heading there shares, so a query is a couple of dict
+    # lookups. overhang is how far past the edge of its cell an entity runs before it jumps; enemies
+    # jump as soon as they reach the edge.
+    def __init__(self, tilemap, entity_size=(48, 64), speed=1, jump_velocity=7, gravity=0.3, max_drop=8, max_cost=900, cache_size=64, overhang=0) -> None:
+        self.tilemap = tilemap
+        self.tile_size = tilemap.size
+        self.speed = speed
+        self.overhang = overhang
+        self.jump_velocity = jump_velocity
+        self.gravity = gravity
+        self.max_drop = max_drop
+        self.max_cost = max_cost
+        self.cache_size = cache_size
+        self.clearance = math.ceil(entity_size[1] / self.tile_size)
+        self.max_rise = int(jump_velocity ** 2 / (2 * gravity) // self.tile_size)
+        # furthest column a jump can land in, taken from the longest fall the graph allows
+        self.reach = 1 + int((speed * self.air_time(-max_drop * self.tile_size) + overhang - 1) // self.tile_size)
+        self.nodes = {}
+        self.links = {}
+        self.incoming = {}
+        self.routes = OrderedDict()
+        self.chunks = None
+        self.dirty = set()
+        self.dirty_cells = set()
+        self.version = 0
+        tilemap.navigation_graphs.append(self)
+
+    def air_time(self, rise):
+        # frames until a jump comes back down to rise pixels above where it started, None above the apex
+        discriminant = self.jump_velocity ** 2 - 2 * self.gravity * rise
+        if discriminant < 0:
+            return None
+        return (self.jump_velocity + math.sqrt(discriminant)) / self.gravity
+
+    def solid(self, x, y):
+        return self.tilemap.is_solid(x, y)
+
+    def clear(self, x, top, bottom):
+        for y in range(top, bottom):
+            if self.solid(x, y):
+                return False
+        return True
+
+    def standing(self, x, y):
+        return self.solid(x, y) and self.clear(x, y - self.clearance, y)
+
+    def column_links(self, x, y, direction):
+        links = []
+        tile_size = self.tile_size
+        for dx in range(1, self.reach + 1):
+            column = x + direction * dx
+            landing = None
+            for row in range(y - self.max_rise, y + self.max_drop + 1):
+                if self.solid(column, row):
+                    landing = row
+                    break
+            if landing is not None and self.standing(column, landing):
+                top = min(y, landing) - self.clearance - (dx > 1)
+                if dx == 1 and landing == y:
+                    kind, cost = "walk", tile_size / self.speed
+                elif dx == 1 and landing > y:
+                    kind, cost = "drop", tile_size / self.speed + math.sqrt(2 * (landing - y) * tile_size / self.gravity)
+                else:
+                    kind, cost = "jump", self.air_time((y - landing) * tile_size)
+                    if cost is None or self.speed * cost + self.overhang < tile_size * (dx - 1) + 1:
+                        cost = None
+                if cost is not None and self.clear(x, top, y) and self.clear(column, top, landing) and all(
+                    self.clear(x + direction * step, top, max(y, landing)) for step in range(1, dx)
+                ):
+                    links.append(((column, landing), round(cost), kind))
+            # a jump further out has to pass over this column
+            if not self.clear(column, y - self.clearance - 1, y):
+                break
+        return links
+
+    def set_links(self, cell, links):
+        for target, cost, kind in self.links.pop(cell, ()):
+            self.incoming[target].pop(cell, None)
+        if links is not None:
+            self.links[cell] = links
+            for target, cost, kind in links:
+                self.incoming.setdefault(target, {})[cell] = (cost, kind)
+
+    def update(self):
+        # a changed tile decides whether the cells up to clearance rows below it are nodes, and the
+        # links of every node that can jump into, over or drop through it, so only those bands
+        # around each changed tile or chunk are rebuilt
+        if self.tilemap.chunks is not self.chunks:
+            # Tilemap.load swaps in a new chunk dict, so everything is stale
+            self.chunks = self.tilemap.chunks
+            self.nodes = {}
+            self.links = {}
+            self.incoming = {}
+            self.dirty = set(self.chunks)
+            self.dirty_cells = set()
+        if not self.dirty and not self.dirty_cells:
+            return
+
+        areas = [(x, y, x + 1, y + 1) for x, y in self.dirty_cells]
+        for chunk_x, chunk_y in self.dirty:
+            areas.append((chunk_x * CHUNK_SIZE, chunk_y * CHUNK_SIZE, (chunk_x + 1) * CHUNK_SIZE, (chunk_y + 1) * CHUNK_SIZE))
+        self.dirty.clear()
+        self.dirty_cells.clear()
+
+        node_bands = {}
+        link_bands = {}
+        for left, top, right, bottom in areas:
+            for x in range(left, right):
+                node_bands.setdefault(x, set()).update(range(top, bottom + self.clearance))
+            for x in range(left - self.reach, right + self.reach):
+                link_bands.setdefault(x, []).append((top - self.max_drop, bottom + self.max_rise + self.clearance + 1))
+
+        removed = []
+        for x, band in node_bands.items():
+            old = self.nodes.get(x, ())
+            fresh = [y for y in band if self.standing(x, y)]
+            removed += [(x, y) for y in old if y in band and y not in fresh]
+            rows = sorted([y for y in old if y not in band] + fresh)
+            if rows:
+                self.nodes[x] = rows
+            else:
+                self.nodes.pop(x, None)
+
+        for x, bands in link_bands.items():
+            rows = self.nodes.get(x, ())
+            linked = set()
+            for top, bottom in bands:
+                linked.update(rows[bisect.bisect_left(rows, top):bisect.bisect_left(rows, bottom)])
+            for y in linked:
+                self.set_links((x, y), self.column_links(x, y, -1) + self.column_links(x, y, 1))
+        for cell in removed:
+            self.set_links(cell, None)
+        for cell in removed:
+            self.incoming.pop(cell, None)
+
+        self.routes.clear()
+        self.version += 1
+
+    def route(self, target):
+        # next hop towards target from every cell within max_cost frames of it, searched backwards
+        # along the incoming links
+        table = self.routes.get(target)
+        if table is not None:
+            self.routes.move_to_end(target)
+            return table
+        table = {}
+        costs = {target: 0}
+        queue = [(0, target)]
+        while queue:
+            cost, cell = heapq.heappop(queue)
+            if cost > costs[cell]:
+                continue
+            for source, (link_cost, kind) in self.incoming.get(cell, {}).items():
+                total = cost + link_cost
+                if total <= self.max_cost and total < costs.get(source, total + 1):
+                    costs[source] = total
+                    table[source] = (cell, kind)
+                    heapq.heappush(queue, (total, source))
+        self.routes[target] = table
+        if len(self.routes) > self.cache_size:
+            self.routes.popitem(last=False)
+        return table
+
+    def standing_cell(self, rect):
+        # the node under an entity resting on the ground, None while it is in the air
+        tile_size = self.tile_size
+        if rect.bottom % tile_size:
+            return None
+        y = rect.bottom // tile_size
+        for x in (rect.centerx // tile_size, rect.left // tile_size, (rect.right - 1) // tile_size):
+            if y in self.nodes.get(x, ()):
+                return (x, y)
+        return None
+
+    def target_cell(self, rect):
+        # the node an entity stands on or, in the air, the first one below it
+        cell = self.standing_cell(rect)
+        if cell is None:
+            x = rect.centerx // self.tile_size
+            rows = self.nodes.get(x, ())
+            for y in range(rect.bottom // self.tile_size, rect.bottom // self.tile_size + self.max_drop + 1):
+                if y in rows:
+                    return (x, y)
+        return cell
+
+    def next_step(self, start, rect, target_rect):
+        # (direction, jump) for an entity with the given rect standing on start, heading for target_rect
+        target = self.target_cell(target_rect)
+        if target is None or target == start:
+            return 0, False
+        hop = self.route(target).get(start)
+        if hop is None:
+            return 0, False
+        cell, kind = hop
+        direction = 1 if cell[0] > start[0] else -1
+        # jumps start overhang pixels past the edge of the cell, or right at it for a step up, where
+        # the step stops the entity
+        overhang = self.overhang if abs(cell[0] - start[0]) > 1 else 0
+        if direction > 0:
+            jump = kind == "jump" and rect.right >= (start[0] + 1) * self.tile_size + overhang
+        else:
+            jump = kind == "jump" and rect.left <= start[0] * self.tile_size - overhang
+        return direction, jump
+
+class PlayerNavGraph(NavGraph):
+    # the player can switch colours, even mid-air, so a magic tile of either colour is somewhere to
+    # stand and never in the way
+    def magic(self, x, y):
+        tile = self.tilemap.get_tile(x, y)
+        return tile is not None and tile.type in MAGIC_COLORS
+
+    def solid(self, x, y):
+        return self.magic(x, y) or self.tilemap.is_solid(x, y)
+
+    def clear(self, x, top, bottom):
+        for y in range(top, bottom):
+            if self.tilemap.is_solid(x, y) and not self.magic(x, y):
+                return False
+        return True
@@ -0,0 +1,187 @@
+import numpy as np
+from scripts.tilemap import CHUNK_SIZE
+
+UP, DOWN, RIGHT, LEFT = range(4)
+
+class PhysicsWorld:
+    # struct-of-arrays mirror of PhysicsEntity.update for many bodies at once; entities keep
+    # views into the rows below as their position and velocity. A body that starts a step embedded
+    # in solid tiles is pushed to the nearest free edge in one pass instead of tile by tile.
+    def __init__(self, tilemap, capacity=64) -> None:
+        self.tilemap = tilemap
+        self.bodies = []
+        self.queued = []
+        self.positions = np.zeros((capacity, 2))
+        self.velocities = np.zeros((capacity, 2))
+        self.sizes = np.zeros((capacity, 2))
+        self.movements = np.zeros((capacity, 2))
+        self.waits = np.zeros(capacity, dtype=bool)
+        self.flips = np.zeros(capacity, dtype=bool)
+        self.collisions = np.zeros((capacity, 4), dtype=bool)
+        self.grid = np.zeros((0, 0), dtype=np.uint8)
+        self.grid_origin = (0, 0)
+        self.tilemap.changed_chunks.clear()
+        self.build_grid()
+
+    def build_grid(self):
+        if not self.tilemap.chunks:
+            self.grid = np.zeros((0, 0), dtype=np.uint8)
+            return
+        chunk_xs = [position[0] for position in self.tilemap.chunks]
+        chunk_ys = [position[1] for position in self.tilemap.chunks]
+        self.grid_origin = (min(chunk_xs) * CHUNK_SIZE, min(chunk_ys) * CHUNK_SIZE)
+        self.grid = np.zeros(((max(chunk_ys) + 1) * CHUNK_SIZE - self.grid_origin[1], (max(chunk_xs) + 1) * CHUNK_SIZE - self.grid_origin[0]), dtype=np.uint8)
+        for position in self.tilemap.chunks:
+            self.copy_chunk(position)
+
+    def copy_chunk(self, position):
+        x = position[0] * CHUNK_SIZE - self.grid_origin[0]
+        y = position[1] * CHUNK_SIZE - self.grid_origin[1]
+        chunk = self.tilemap.chunks.get(position)
+        if chunk:
+            self.grid[y:y + CHUNK_SIZE, x:x + CHUNK_SIZE] = np.frombuffer(chunk.solid, dtype=np.uint8).reshape(CHUNK_SIZE, CHUNK_SIZE)
+        else:
+            self.grid[y:y + CHUNK_SIZE, x:x + CHUNK_SIZE] = 0
+
+    def sync_grid(self):
+        changed = self.tilemap.changed_chunks
+        if not changed:
+            return
+        height, width = self.grid.shape
+        for position in changed:
+            x = position[0] * CHUNK_SIZE - self.grid_origin[0]
+            y = position[1] * CHUNK_SIZE - self.grid_origin[1]
+            if not (0 <= x < width and 0 <= y < height):
+                self.build_grid()
+                break
+            self.copy_chunk(position)
+        changed.clear()
+
+    def grow(self, capacity):
+        for name in ("positions", "velocities", "sizes", "movements", "waits", "flips", "collisions"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        for row, entity in enumerate(self.bodies):
+            self.bind(entity, row)
+
+    def bind(self, entity, row):
+        entity.world = self
+        entity.row = row
+        entity.position = self.positions[row]
+        entity.velocity = self.velocities[row]
+
+    def add(self, entity):
+        row = len(self.bodies)
+        if row == len(self.positions):
+            self.grow(2 * row)
+        self.bodies.append(entity)
+        self.positions[row] = entity.position
+        self.velocities[row] = entity.velocity
+        self.sizes[row] = entity.size
+        self.flips[row] = entity.flip
+        self.bind(entity, row)
+
+    def remove(self, entity):
+        row = entity.row
+        entity.position = [float(value) for value in self.positions[row]]
+        entity.velocity = [float(value) for value in self.velocities[row]]
+        entity.world = None
+        entity.row = None
+
+        last = len(self.bodies) - 1
+        moved = self.bodies.pop()
+        if row != last:
+            self.bodies[row] = moved
+            for array in (self.positions, self.velocities, self.sizes, self.movements, self.waits, self.flips, self.collisions):
+                array[row] = array[last]
+            self.bind(moved, row)
+
+    def queue(self, entity, movement):
+        self.movements[entity.row] = movement
+        self.waits[entity.row] = entity.wait
+        self.queued.append(entity)
+
+    def solid(self, columns, rows):
+        columns = columns - self.grid_origin[0]
+        rows = rows - self.grid_origin[1]
+        height, width = self.grid.shape
+        if not height:
+            return np.zeros(np.broadcast(columns, rows).shape, dtype=bool)
+        inside = (columns >= 0) & (columns < width) & (rows >= 0) & (rows < height)
+        return self.grid[np.clip(rows, 0, height - 1), np.clip(columns, 0, width - 1)].astype(bool) & inside
+
+    def overlaps(self, positions, sizes):
+        # the same neighbourhood as Tilemap.rects_around, tested against pygame.Rect's truncated coordinates
+        tile_size = self.tilemap.size
+        column = np.floor(positions[:, 0] / tile_size).astype(np.int64)
+        top = np.floor(positions[:, 1] / tile_size).astype(np.int64)
+        bottom = np.where(sizes[:, 1] > tile_size, np.floor((positions[:, 1] + sizes[:, 1] - tile_size) / tile_size).astype(np.int64), top)
+        row_count = int((bottom - top).max()) + 3
+        columns = column[:, None, None] + np.arange(-1, 2)[None, :, None]
+        rows = top[:, None, None] + np.arange(-1, row_count - 1)[None, None, :]
+        in_range = rows <= bottom[:, None, None] + 1
+
+        left = np.trunc(positions[:, 0])[:, None, None]
+        top_edge = np.trunc(positions[:, 1])[:, None, None]
+        tile_left = columns * tile_size
+        tile_top = rows * tile_size
+        overlap = self.solid(columns, rows) & in_range
+        overlap &= (left < tile_left + tile_size) & (left + sizes[:, 0][:, None, None] > tile_left)
+        overlap &= (top_edge < tile_top + tile_size) & (top_edge + sizes[:, 1][:, None, None] > tile_top)
+        return overlap, np.broadcast_to(tile_left, overlap.shape), np.broadcast_to(tile_top, overlap.shape)
+
+    def resolve(self, positions, sizes, frame_movement, active, collisions, axis):
+        tile_size = self.tilemap.size
+        overlap, tile_left, tile_top = self.overlaps(positions, sizes)
+        hit = overlap.any(axis=(1, 2)) & active
+        if not hit.any():
+            return
+        tile_start = tile_left if axis == 0 else tile_top
+        forward = hit & (frame_movement > 0)
+        backward = hit & (frame_movement < 0)
+        edge = np.trunc(positions[:, axis])
+        nearest = np.where(overlap, tile_start, np.inf).min(axis=(1, 2))
+        farthest = np.where(overlap, tile_start + tile_size, -np.inf).max(axis=(1, 2))
+        edge = np.where(forward, nearest - sizes[:, axis], edge)
+        edge = np.where(backward, farthest, edge)
+        positions[hit, axis] = edge[hit]
+        # PhysicsEntity.update never raises the 'left' flag, so neither does the batched step
+        collisions[forward, RIGHT if axis == 0 else DOWN] = True
+        if axis == 1:
+            collisions[backward, UP] = True
+
+    def step(self):
+        stepped = self.queued
+        self.queued = []
+        if not stepped:
+            return stepped
+        self.sync_grid()
+
+        rows = np.fromiter((entity.row for entity in stepped), dtype=np.int64, count=len(stepped))
+        positions = self.positions[rows]
+        velocities = self.velocities[rows]
+        sizes = self.sizes[rows]
+        active = ~self.waits[rows]
+        collisions = np.zeros((len(rows), 4), dtype=bool)
+        frame_movement = self.movements[rows] + velocities
+
+        positions[:, 0] += np.where(active, frame_movement[:, 0], 0)
+        self.resolve(positions, sizes, frame_movement[:, 0], active, collisions, 0)
+        positions[:, 1] += np.where(active, frame_movement[:, 1], 0)
+        self.resolve(positions, sizes, frame_movement[:, 1], active, collisions, 1)
+
+        flips = self.flips[rows]
+        flips[active & (frame_movement[:, 0] > 0)] = False
+        flips[active & (frame_movement[:, 0] < 0)] = True
+
+        velocities[:, 1] = np.minimum(7, velocities[:, 1] + 0.3)
+        velocities[collisions[:, DOWN] | collisions[:, UP], 1] = 0
+        velocities[collisions[:, RIGHT] | collisions[:, LEFT], 0] = 0
+
+        self.positions[rows] = positions
+        self.velocities[rows] = velocities
+        self.flips[rows] = flips
+        self.collisions[rows] = collisions
+        return stepped
@@ -0,0 +1,12 @@
+import pygame
+
+class Presenter:
+    # scales the low resolution display straight into the window surface instead of allocating
+    # a full size copy every frame
+    def __init__(self, screen, display) -> None:
+        self.screen = screen
+        self.display = display
+
+    def present(self):
+        pygame.transform.scale(self.display, self.screen.get_size(), self.screen)
+        pygame.display.update()
@@ -0,0 +1,84 @@
+import pygame, time, csv
+from collections import deque
+
+STAGES = (
+    "streaming", "player", "villagers", "projectiles", "enemies", "physics", "collisions", "events",
+    "background", "entities", "tilemap", "ui", "present", "idle",
+)
+
+class FrameProfiler:
+    # mark(stage) charges the time since the previous mark to that stage, so a frame needs one
+    # perf_counter call per stage; with the profiler off every call returns straight away
+    def __init__(self, window=240, refresh=15) -> None:
+        self.enabled = False
+        self.overlay = False
+        self.window = window
+        self.refresh = refresh
+        self.samples = {}
+        self.current = {}
+        self.frame = 0
+        self.frame_start = 0
+        self.last = 0
+        self.csv_file = None
+        self.csv_writer = None
+        self.font = None
+        self.overlay_images = []
+
+    def begin_frame(self):
+        if self.enabled:
+            self.frame_start = self.last = time.perf_counter()
+
+    def mark(self, stage):
+        if self.enabled:
+            now = time.perf_counter()
+            self.current[stage] = self.current.get(stage, 0) + now - self.last
+            self.last = now
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        self.current["frame"] = time.perf_counter() - self.frame_start
+        for stage, seconds in self.current.items():
+            if stage not in self.samples:
+                self.samples[stage] = deque(maxlen=self.window)
+            self.samples[stage].append(seconds)
+        if self.csv_writer:
+            self.csv_writer.writerow([self.frame] + [round(self.current.get(stage, 0) * 1000, 4) for stage in STAGES + ("frame",)])
+        self.current.clear()
+        self.frame += 1
+
+    def percentiles(self, stage):
+        ordered = sorted(self.samples[stage])
+        return tuple(ordered[min(len(ordered) - 1, int(len(ordered) * rank))] for rank in (0.5, 0.95, 0.99))
+
+    def toggle_overlay(self):
+        self.overlay = not self.overlay
+        self.enabled = self.overlay or self.csv_writer is not None
+        self.overlay_images = []
+
+    def export_csv(self, path):
+        self.csv_file = open(path, "w", newline="")
+        self.csv_writer = csv.writer(self.csv_file)
+        self.csv_writer.writerow(["frame"] + [stage + "_ms" for stage in STAGES + ("frame",)])
+        self.enabled = True
+
+    def close(self):
+        if self.csv_file:
+            self.csv_file.close()
+            self.csv_file = None
+            self.csv_writer = None
+            self.enabled = self.overlay
+
+    def render(self, surface):
+        if not self.overlay:
+            return
+        if self.frame % self.refresh == 0 or not self.overlay_images:
+            if self.font is None:
+                self.font = pygame.font.SysFont("Arial", 10)
+            lines = ["stage        p50 / p95 / p99 ms"]
+            for stage in STAGES + ("frame",):
+                if stage in self.samples:
+                    lines.append(stage.ljust(12) + " / ".join(str(round(value * 1000, 2)) for value in self.percentiles(stage)))
+            self.overlay_images = [self.font.render(line, True, (255, 255, 0), (0, 0, 0)) for line in lines]
+        for i, img in enumerate(self.overlay_images):
+            surface.blit(img, (surface.get_width() - 150, 40 + 11 * i))
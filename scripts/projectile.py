@@ -1,6 +1,8 @@
 import pygame
 
 class Projectile:
+    __slots__ = ("game", "position", "type", "size", "velocity", "flip", "movement_counter", "animation")
+
     def __init__(self, game, position, size, type, flip=False) -> None:
         self.game = game
         self.position = list(position)
@@ -19,6 +21,12 @@ class Projectile:
         return pygame.Rect(self.position[0], self.position[1], self.size[0], self.size[1])
     
     def update(self, movement=5):
+        # a shot that starts inside a wall, as one fired point-blank does, or would reach one this
+        # frame stops there; sweep only looks ahead of the leading edge
+        rect = self.rect()
+        distance = -movement if self.flip else movement
+        if self.game.tilemap.overlaps_solid(rect) or self.game.tilemap.sweep(rect, distance, 0) != distance:
+            return True
         if self.flip:
             frame_movement = movement 
             self.position[0] -= frame_movement
@@ -33,7 +41,4 @@ class Projectile:
             return self.movement_counter > 150
     
     def render(self, surface, offset=(0,0)):
-        if self.flip:
-            surface.blit(pygame.transform.flip(self.game.assets["projectile/" + self.type].img(), True, False), (self.position[0] - offset[0], self.position[1] - offset[1]))
-        else:
-            surface.blit(self.game.assets["projectile/" + self.type].img(), (self.position[0] - offset[0], self.position[1] - offset[1]))
+        surface.blit(self.game.assets["projectile/" + self.type].img(self.flip), (self.position[0] - offset[0], self.position[1] - offset[1]))
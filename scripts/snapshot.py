@@ -0,0 +1,169 @@
+import struct
+from scripts.entities import Enemy, Villager
+from scripts.projectile import Projectile
+
+MAGIC = b"CWSV"
+VERSION = 2
+TILE_TYPES = (None, "grass", "stone", "pink", "pink_border", "blue", "blue_border", "yellow_key_door", "red_key_door")
+ACTIONS = ("", "idle", "run", "jump", "fall", "shooting", "chase", "attack")
+COLORS = ("pink", "blue")
+SCREENS = ("on_title_screen", "on_game", "game_over", "on_victory_screen", "yellow_key", "yellow_door_removed", "red_key", "red_door_removed")
+
+HEADER = struct.Struct("<4sHBBHHiiHHHHIBB")
+RANDOM_STATE = struct.Struct("<625I?d")
+PLAYER = struct.Struct("<dddd?bBBhhIbb?BH?")
+ENEMY = struct.Struct("<Hdddd??hBH?BBb")
+VILLAGER = struct.Struct("<dddd?BH")
+PROJECTILE = struct.Struct("<ddB?d")
+SPAWNER = struct.Struct("<Hii")
+DELTA = struct.Struct("<iiBH")
+
+# layout: header, random generator state, player, then enemies (each followed by the colour of
+# every weakness it was spawned with), villagers, projectiles, unspawned enemy spawners, removed
+# door types and tile deltas against the level file
+
+def save_snapshot(game):
+    player = game.player
+    tilemap = game.tilemap
+    flags = sum(1 << bit for bit, name in enumerate(SCREENS) if getattr(game, name))
+    movement = game.horizontal_movement[0] | game.horizontal_movement[1] << 1
+    deltas = tilemap.tile_deltas()
+    version, state, gauss = game.random.getstate()
+
+    data = bytearray(HEADER.pack(
+        MAGIC, VERSION, flags, movement, game.enemy_counter, game.enemy_total, game.scroll[0], game.scroll[1],
+        len(game.enemies), len(game.villagers), len(game.projectiles), len(game.enemy_spawners), len(deltas),
+        len(tilemap.removed_types), TILE_TYPES.index(tilemap.magic_state),
+    ))
+    data += RANDOM_STATE.pack(*state, gauss is not None, gauss or 0)
+    data += PLAYER.pack(
+        player.position[0], player.position[1], player.velocity[0], player.velocity[1], player.flip,
+        player.health, player.health_maximum, COLORS.index(player.projectile_type), player.invincibility,
+        player.shoot_cooldown, player.air_time, player.jumps, player.jump_cap, player.wait,
+        ACTIONS.index(player.action), player.animation.frame, player.animation.done,
+    )
+    for enemy in game.enemies:
+        data += ENEMY.pack(
+            enemy.id, enemy.position[0], enemy.position[1], enemy.velocity[0], enemy.velocity[1], enemy.flip,
+            enemy.wait, enemy.attack_cooldown, ACTIONS.index(enemy.action), enemy.animation.frame,
+            enemy.animation.done, len(enemy.weaknesses), len(enemy.auxiliar_weaknesses), enemy.chase_direction,
+        )
+        data += bytes(COLORS.index(weakness.type) for weakness in enemy.auxiliar_weaknesses)
+    for villager in game.villagers:
+        data += VILLAGER.pack(
+            villager.position[0], villager.position[1], villager.velocity[0], villager.velocity[1], villager.flip,
+            ACTIONS.index(villager.action), villager.animation.frame,
+        )
+    for projectile in game.projectiles:
+        data += PROJECTILE.pack(projectile.position[0], projectile.position[1], COLORS.index(projectile.type), projectile.flip, projectile.movement_counter)
+    for id, spawner in game.enemy_spawners:
+        data += SPAWNER.pack(id, spawner[0], spawner[1])
+    data += bytes(TILE_TYPES.index(tile_type) for tile_type in sorted(tilemap.removed_types))
+    for x, y, tile_type, variant in deltas:
+        data += DELTA.pack(x, y, TILE_TYPES.index(tile_type), variant)
+    return bytes(data)
+
+def restore_animation(entity, action, frame, done):
+    entity.action = ""
+    entity.set_action(ACTIONS[action])
+    entity.animation.frame = frame
+    entity.animation.done = done
+
+def check_snapshot(data):
+    # walks the layout without touching the game, so a stale or cut off save is a ValueError before
+    # load_snapshot resets anything
+    if len(data) < HEADER.size:
+        raise ValueError("snapshot cut off in the header")
+    header = HEADER.unpack_from(data, 0)
+    if header[0] != MAGIC or header[1] != VERSION:
+        raise ValueError("not a version " + str(VERSION) + " snapshot")
+    enemy_count, villager_count, projectile_count, spawner_count, delta_count, removed_count = header[8:14]
+    offset = HEADER.size + RANDOM_STATE.size + PLAYER.size
+    for _ in range(enemy_count):
+        if offset + ENEMY.size > len(data):
+            break
+        offset += ENEMY.size + ENEMY.unpack_from(data, offset)[12]
+    offset += villager_count * VILLAGER.size + projectile_count * PROJECTILE.size + spawner_count * SPAWNER.size + removed_count + delta_count * DELTA.size
+    if offset != len(data):
+        raise ValueError("snapshot is " + str(len(data)) + " bytes, its header describes " + str(offset))
+
+def load_snapshot(game, data):
+    check_snapshot(data)
+    (magic, version, flags, movement, enemy_counter, enemy_total, scroll_x, scroll_y, enemy_count, villager_count,
+     projectile_count, spawner_count, delta_count, removed_count, magic_state) = HEADER.unpack_from(data, 0)
+    offset = HEADER.size
+    random_state = RANDOM_STATE.unpack_from(data, offset)
+    offset += RANDOM_STATE.size
+
+    # entities are rebuilt on top of a fresh game loop; their constructors draw from game.random,
+    # which is put back to the saved state at the end
+    game.set_up_game_loop(spawn=False)
+    for bit, name in enumerate(SCREENS):
+        setattr(game, name, bool(flags & 1 << bit))
+    game.horizontal_movement = [bool(movement & 1), bool(movement & 2)]
+    game.enemy_counter = enemy_counter
+    game.enemy_total = enemy_total
+    game.scroll = [scroll_x, scroll_y]
+
+    player = game.player
+    (x, y, velocity_x, velocity_y, player.flip, player.health, player.health_maximum, projectile_type, player.invincibility,
+     player.shoot_cooldown, player.air_time, player.jumps, player.jump_cap, player.wait, action, frame, done) = PLAYER.unpack_from(data, offset)
+    offset += PLAYER.size
+    player.position[0], player.position[1] = x, y
+    player.velocity[0], player.velocity[1] = velocity_x, velocity_y
+    player.projectile_type = COLORS[projectile_type]
+    restore_animation(player, action, frame, done)
+    game.rebuild_hearts()
+
+    for _ in range(enemy_count):
+        id, x, y, velocity_x, velocity_y, flip, wait, attack_cooldown, action, frame, done, remaining, total, chase_direction = ENEMY.unpack_from(data, offset)
+        offset += ENEMY.size
+        enemy = Enemy(id, game, [x, y], (48, 64), total)
+        enemy.velocity = [velocity_x, velocity_y]
+        enemy.flip = flip
+        enemy.wait = wait
+        enemy.attack_cooldown = attack_cooldown
+        enemy.chase_direction = chase_direction
+        for weakness, color in zip(enemy.auxiliar_weaknesses, data[offset:offset + total]):
+            weakness.type = COLORS[color]
+            weakness.animation = game.assets["weakness/" + weakness.type]
+            weakness.update(enemy.position, enemy.flip)
+        offset += total
+        # hits take weaknesses off the front, so the remaining ones are always the last few
+        enemy.weaknesses = enemy.auxiliar_weaknesses[total - remaining:]
+        restore_animation(enemy, action, frame, done)
+        game.add_enemy(enemy)
+
+    for _ in range(villager_count):
+        x, y, velocity_x, velocity_y, flip, action, frame = VILLAGER.unpack_from(data, offset)
+        offset += VILLAGER.size
+        villager = Villager(game, [x, y], (48, 64))
+        villager.velocity = [velocity_x, velocity_y]
+        villager.flip = flip
+        restore_animation(villager, action, frame, False)
+        game.add_villager(villager)
+
+    for _ in range(projectile_count):
+        x, y, projectile_type, flip, movement_counter = PROJECTILE.unpack_from(data, offset)
+        offset += PROJECTILE.size
+        projectile = Projectile(game, (x, y), (48, 16), COLORS[projectile_type], flip=flip)
+        projectile.position = [x, y]
+        projectile.movement_counter = movement_counter
+        game.projectiles.append(projectile)
+
+    game.enemy_spawners = []
+    for _ in range(spawner_count):
+        id, x, y = SPAWNER.unpack_from(data, offset)
+        offset += SPAWNER.size
+        game.enemy_spawners.append((id, (x, y)))
+
+    removed_types = [TILE_TYPES[tile_type] for tile_type in data[offset:offset + removed_count]]
+    offset += removed_count
+    deltas = []
+    for _ in range(delta_count):
+        x, y, tile_type, variant = DELTA.unpack_from(data, offset)
+        offset += DELTA.size
+        deltas.append((x, y, TILE_TYPES[tile_type], variant))
+    game.tilemap.restore_deltas(deltas, TILE_TYPES[magic_state], removed_types)
+
+    game.random.setstate((3, tuple(random_state[:625]), random_state[626] if random_state[625] else None))
@@ -0,0 +1,61 @@
+class SpatialHash:
+    def __init__(self, cell_size=96) -> None:
+        self.cell_size = cell_size
+        self.cells = {}
+        self.entries = {}
+        self.count = 0
+
+    def cells_for(self, rect):
+        cells = []
+        for x in range(rect.left // self.cell_size, (rect.right - 1) // self.cell_size + 1):
+            for y in range(rect.top // self.cell_size, (rect.bottom - 1) // self.cell_size + 1):
+                cells.append((x, y))
+        return cells
+
+    def clear(self):
+        self.cells.clear()
+        self.entries.clear()
+        self.count = 0
+
+    def insert(self, item, rect):
+        # entries remember their insertion order so queries come back in the same order as the source list
+        self.add_entry((self.count, item, rect))
+        self.count += 1
+
+    def add_entry(self, entry):
+        self.entries[entry[1]] = entry
+        for cell in self.cells_for(entry[2]):
+            if cell in self.cells:
+                self.cells[cell].append(entry)
+            else:
+                self.cells[cell] = [entry]
+
+    def move(self, item, rect):
+        # keeps the item's place in the query order
+        entry = self.entries.get(item)
+        if entry is None:
+            self.insert(item, rect)
+        elif entry[2] != rect:
+            self.remove(item)
+            self.add_entry((entry[0], item, rect))
+
+    def remove(self, item):
+        entry = self.entries.pop(item, None)
+        if entry:
+            for cell in self.cells_for(entry[2]):
+                self.cells[cell].remove(entry)
+                if not self.cells[cell]:
+                    del self.cells[cell]
+
+    def rebuild(self, items):
+        self.clear()
+        for item in items:
+            self.insert(item, item.rect())
+
+    def query(self, rect):
+        found = {}
+        for cell in self.cells_for(rect):
+            for entry in self.cells.get(cell, ()):
+                if entry[0] not in found and entry[2].colliderect(rect):
+                    found[entry[0]] = entry[1]
+        return [found[order] for order in sorted(found)]
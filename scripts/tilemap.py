@@ -1,147 +1,641 @@
 import pygame, json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from scripts.level import LevelFile, is_level_file, load_level, save_level
+from scripts.spatial import SpatialHash
 
 PHYSICS_TILES = {"grass", "stone", "pink", "blue", "yellow_key_door", "red_key_door"}
 MAGIC_TILES = {"pink", "blue"}
+# the colour every magic tile type belongs to, solid or not
+MAGIC_COLORS = {"pink": "pink", "pink_border": "pink", "blue": "blue", "blue_border": "blue"}
 NEIGHBOR_OFFSETS = [
     (-1, 0), (-1, -1), (0, -1), (0, 0), (0, 1), (1, 1), (1, 0), (-1, 1), (1, -1)
 ]
+MAGIC_SWITCHES = {
+    "pink": {"pink": "pink_border", "blue_border": "blue"},
+    "blue": {"blue": "blue_border", "pink_border": "pink"},
+}
+CHUNK_SIZE = 8
+# about 590 KB each at 48 px tiles; a view needs six, the rest are kept for scrolling back
+BAKED_CHUNK_LIMIT = 32
+AUTOTILE_TYPES = {"grass", "stone"}
+
+class Tile:
+    __slots__ = ("type", "variant", "pos")
+
+    def __init__(self, tile_type, variant, pos) -> None:
+        self.type = tile_type
+        self.variant = variant
+        self.pos = pos
+
+    def to_dict(self):
+        return {"type": self.type, "variant": self.variant, "pos": list(self.pos)}
+
+class Chunk:
+    __slots__ = ("position", "tile_size", "size", "tiles", "solid", "rects", "count", "surface", "dirty")
+
+    def __init__(self, position, tile_size, size=CHUNK_SIZE) -> None:
+        self.position = position
+        self.tile_size = tile_size
+        self.size = size
+        self.tiles = [None] * (size * size)
+        self.solid = bytearray(size * size)
+        self.rects = [None] * (size * size)
+        self.count = 0
+        self.surface = None
+        self.dirty = True
+
+    def get(self, x, y):
+        return self.tiles[(y % self.size) * self.size + x % self.size]
+
+    def set(self, x, y, tile):
+        index = (y % self.size) * self.size + x % self.size
+        if self.tiles[index] is None:
+            self.count += 1
+        self.tiles[index] = tile
+        self.solid[index] = tile.type in PHYSICS_TILES
+        self.dirty = True
+
+    def remove(self, x, y):
+        index = (y % self.size) * self.size + x % self.size
+        tile = self.tiles[index]
+        if tile is not None:
+            self.tiles[index] = None
+            self.solid[index] = 0
+            self.count -= 1
+            self.dirty = True
+        return tile
+
+    def rect(self, index):
+        rect = self.rects[index]
+        if rect is None:
+            rect = self.rects[index] = pygame.Rect(
+                (self.position[0] * self.size + index % self.size) * self.tile_size,
+                (self.position[1] * self.size + index // self.size) * self.tile_size,
+                self.tile_size,
+                self.tile_size
+            )
+        return rect
+
+    def bake(self, assets):
+        if self.surface is None:
+            self.surface = pygame.Surface((self.size * self.tile_size, self.size * self.tile_size)).convert()
+            self.surface.set_colorkey((0, 0, 0))
+        self.surface.fill((0, 0, 0))
+        for index, tile in enumerate(self.tiles):
+            if tile is not None:
+                self.surface.blit(
+                    assets[tile.type][tile.variant],
+                    ((index % self.size) * self.tile_size, (index // self.size) * self.tile_size)
+                )
+        self.dirty = False
+
+def build_chunk(position, tile_size, records, types):
+    # fill a detached chunk from (x, y, type id, variant) records that all fall inside it
+    chunk = Chunk(position, tile_size)
+    base_x = position[0] * CHUNK_SIZE
+    base_y = position[1] * CHUNK_SIZE
+    solid = [tile_type in PHYSICS_TILES for tile_type in types]
+    for x, y, type_id, variant in records:
+        index = (y - base_y) * CHUNK_SIZE + x - base_x
+        chunk.tiles[index] = Tile(types[type_id], variant, (x, y))
+        chunk.solid[index] = solid[type_id]
+        chunk.count += 1
+    return chunk
 
 class Tilemap:
     def __init__(self, game, tile_size=16) -> None:
         self.game = game
-        self.tilemap = {}
+        self.chunks = {}
+        self.type_index = {}
         self.enemy_spawner = []
         self.offgrid_tiles = []
+        self.offgrid_index = SpatialHash()
         self.size = tile_size
-    
+        self.magic_state = None
+        self.removed_types = set()
+        # (type, variant) from the level file for every cell the game has switched or removed since
+        self.base_tiles = {}
+        self.level = None
+        # chunks whose solidity changed since a PhysicsWorld last synced its grid
+        self.changed_chunks = set()
+        # set by the editor's MapJournal, which logs every edit and off-grid change
+        self.journal = None
+        self.journal_sequence = 0
+        # every NavGraph built on this map, each patching itself for the chunks that change
+        self.navigation_graphs = []
+        # chunks holding a baked surface, least recently drawn first
+        self.baked = OrderedDict()
+        self.baked_limit = BAKED_CHUNK_LIMIT
+
     def load(self, path):
+        self.stop_streaming()
+        self.magic_state = None
+        self.removed_types = set()
+        self.base_tiles = {}
+        self.journal_sequence = 0
+        self.release_baked(0)
+        if is_level_file(path):
+            return load_level(self, path)
+
         with open(path, "r") as file:
             map_data = json.load(file)
 
-        self.tilemap = map_data["tilemap"]
+        self.chunks = {}
+        self.type_index = {}
         self.size = map_data["tile_size"]
-        self.offgrid_tiles = map_data["offgrid"]
+        self.journal_sequence = map_data.get("journal_sequence", 0)
+        for tile in map_data["tilemap"].values():
+            self.set_tile(tile["pos"][0], tile["pos"][1], tile["type"], tile["variant"])
+        self.set_offgrid(map_data["offgrid"])
 
     def save(self, path):
+        if is_level_file(path):
+            return save_level(self, path)
+
         with open(path, "w") as file:
-            json.dump({"tilemap": self.tilemap, "tile_size": self.size, "offgrid": self.offgrid_tiles}, file)
+            json.dump(self.map_data(), file)
+
+    def map_data(self):
+        tilemap = {}
+        for tile in self.all_tiles():
+            tilemap[str(tile.pos[0]) + ";" + str(tile.pos[1])] = tile.to_dict()
+        return {"tilemap": tilemap, "tile_size": self.size, "offgrid": [tile.to_dict() for tile in self.offgrid_tiles], "journal_sequence": self.journal_sequence}
+
+    def get_tile(self, x, y):
+        chunk = self.chunks.get((x // CHUNK_SIZE, y // CHUNK_SIZE))
+        if chunk:
+            return chunk.get(x, y)
+
+    def set_tile(self, x, y, tile_type, variant=0):
+        chunk_location = (x // CHUNK_SIZE, y // CHUNK_SIZE)
+        chunk = self.chunks.get(chunk_location)
+        if chunk is None:
+            chunk = self.chunks[chunk_location] = Chunk(chunk_location, self.size)
+        previous = chunk.get(x, y)
+        if previous is not None:
+            self.type_index[previous.type].discard(previous.pos)
+        tile = Tile(tile_type, variant, (x, y))
+        chunk.set(x, y, tile)
+        self.type_index.setdefault(tile_type, set()).add(tile.pos)
+        self.chunk_changed(chunk_location, (x, y))
+        return tile
+
+    def load_chunk(self, position, records, types):
+        return self.add_chunk(build_chunk(position, self.size, records, types))
+
+    def add_chunk(self, chunk):
+        self.chunks[chunk.position] = chunk
+        self.chunk_changed(chunk.position)
+        for tile in chunk.tiles:
+            if tile is not None:
+                self.type_index.setdefault(tile.type, set()).add(tile.pos)
+        return chunk
+
+    def chunk_changed(self, position, cell=None):
+        # cell is the one tile that changed, None when the whole chunk came or went
+        self.changed_chunks.add(position)
+        for graph in self.navigation_graphs:
+            if cell is None:
+                graph.dirty.add(position)
+            else:
+                graph.dirty_cells.add(cell)
+
+    def set_tile_type(self, tile, tile_type):
+        location = tile.pos
+        self.base_tiles.setdefault(location, (tile.type, tile.variant))
+        self.type_index[tile.type].discard(location)
+        tile.type = tile_type
+        chunk_location = (location[0] // CHUNK_SIZE, location[1] // CHUNK_SIZE)
+        self.chunks[chunk_location].set(location[0], location[1], tile)
+        self.type_index.setdefault(tile_type, set()).add(location)
+        self.chunk_changed(chunk_location, location)
+
+    def remove_tile(self, x, y):
+        chunk_location = (x // CHUNK_SIZE, y // CHUNK_SIZE)
+        chunk = self.chunks.get(chunk_location)
+        if chunk:
+            tile = chunk.remove(x, y)
+            if tile is not None:
+                self.type_index[tile.type].discard(tile.pos)
+                self.chunk_changed(chunk_location, (x, y))
+            if not chunk.count:
+                del self.chunks[chunk_location]
+                self.baked.pop(chunk_location, None)
+            return tile
+
+    def edit(self, changes):
+        # the one entry point for bulk edits: applies (x, y, tile type or None, variant) cell changes
+        # and returns the changes that undo them, skipping cells that already match
+        undo = []
+        applied = []
+        for x, y, tile_type, variant in changes:
+            previous = self.get_tile(x, y)
+            if previous is None:
+                if tile_type is None:
+                    continue
+                undo.append((x, y, None, 0))
+            elif previous.type != tile_type or previous.variant != variant:
+                undo.append((x, y, previous.type, previous.variant))
+            else:
+                continue
+            if tile_type is None:
+                self.remove_tile(x, y)
+            else:
+                self.set_tile(x, y, tile_type, variant)
+            applied.append((x, y, tile_type, variant))
+        undo.reverse()
+        if self.journal and applied:
+            self.journal.log_tiles(applied)
+        return undo
+
+    def flood_region(self, x, y, limit=4096):
+        # cells 4-connected to (x, y) that hold the same tile type, or are all empty; None when the
+        # region runs past limit cells, which is what an open area of empty cells does
+        start = self.get_tile(x, y)
+        tile_type = start.type if start else None
+        region = [(x, y)]
+        seen = {(x, y)}
+        for cell_x, cell_y in region:
+            for neighbor in ((cell_x + 1, cell_y), (cell_x - 1, cell_y), (cell_x, cell_y + 1), (cell_x, cell_y - 1)):
+                if neighbor in seen:
+                    continue
+                tile = self.get_tile(*neighbor)
+                if (tile.type if tile else None) == tile_type:
+                    seen.add(neighbor)
+                    region.append(neighbor)
+                    if len(region) > limit:
+                        return None
+        return region
+
+    def autotile(self):
+        # grass and stone show their top edge unless covered, rounded on the side with no neighbour
+        changes = []
+        for tile_type in AUTOTILE_TYPES:
+            for x, y in self.type_index.get(tile_type, ()):
+                if self.get_tile(x, y - 1):
+                    variant = 3
+                else:
+                    left = self.get_tile(x - 1, y) is not None
+                    right = self.get_tile(x + 1, y) is not None
+                    variant = 0 if left == right else 1 if left else 2
+                changes.append((x, y, tile_type, variant))
+        return self.edit(changes)
+
+    def set_offgrid(self, tiles):
+        self.offgrid_tiles = []
+        self.offgrid_index = SpatialHash()
+        for tile in tiles:
+            self.add_offgrid(Tile(tile["type"], tile["variant"], tuple(tile["pos"])))
+
+    def offgrid_rect(self, tile):
+        if self.game is None:
+            return pygame.Rect(tile.pos[0], tile.pos[1], self.size, self.size)
+        image = self.game.assets[tile.type][tile.variant]
+        return pygame.Rect(tile.pos[0], tile.pos[1], image.get_width(), image.get_height())
+
+    def add_offgrid(self, tile):
+        self.offgrid_tiles.append(tile)
+        self.offgrid_index.insert(tile, self.offgrid_rect(tile))
+        if self.journal:
+            self.journal.log("offgrid_add", tile.type, tile.variant, tile.pos[0], tile.pos[1])
+        return tile
+
+    def remove_offgrid(self, tile):
+        self.offgrid_tiles.remove(tile)
+        self.offgrid_index.remove(tile)
+        if self.journal:
+            self.journal.log("offgrid_remove", tile.type, tile.variant, tile.pos[0], tile.pos[1])
+
+    def offgrid_at(self, point):
+        return self.offgrid_index.query(pygame.Rect(point[0], point[1], 1, 1))
+
+    def stream(self, path, radius=3, capacity=128):
+        # page chunks of a binary level in and out around the camera instead of loading it whole
+        self.stop_streaming()
+        self.level = LevelFile(path)
+        self.base_tiles = {}
+        self.chunks = {}
+        self.type_index = {}
+        self.size = self.level.tile_size
+        self.set_offgrid(self.level.offgrid_tiles())
+        self.stream_radius = radius
+        self.stream_capacity = capacity
+        self.resident = OrderedDict()
+        self.pending = {}
+        self.window = (0, 0, -1, -1)
+        self.loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chunk-loader")
+
+    def stop_streaming(self):
+        if self.level is not None:
+            self.loader.shutdown(wait=True, cancel_futures=True)
+            self.level.close()
+            self.level = None
+
+    def read_chunk(self, position):
+        return build_chunk(position, self.size, self.level.records(position), self.level.types)
+
+    def install_chunk(self, chunk):
+        # replay the door removals and magic switch that happened while the chunk was on disk
+        switches = MAGIC_SWITCHES.get(self.magic_state, {})
+        for tile in chunk.tiles:
+            if tile is None:
+                continue
+            if tile.type in self.removed_types:
+                self.base_tiles.setdefault(tile.pos, (tile.type, tile.variant))
+                chunk.remove(tile.pos[0], tile.pos[1])
+            elif tile.type in switches:
+                self.base_tiles.setdefault(tile.pos, (tile.type, tile.variant))
+                tile.type = switches[tile.type]
+                chunk.set(tile.pos[0], tile.pos[1], tile)
+        self.resident[chunk.position] = True
+        if chunk.count:
+            self.add_chunk(chunk)
+
+    def evict_chunk(self, position):
+        del self.resident[position]
+        chunk = self.chunks.pop(position, None)
+        self.baked.pop(position, None)
+        if chunk:
+            self.chunk_changed(position)
+            for tile in chunk.tiles:
+                if tile is not None:
+                    self.type_index[tile.type].discard(tile.pos)
+
+    def update_streaming(self, offset, view_size):
+        if self.level is None:
+            return
+
+        chunk_pixels = CHUNK_SIZE * self.size
+        left = int(offset[0] // chunk_pixels)
+        top = int(offset[1] // chunk_pixels)
+        right = int((offset[0] + view_size[0] - 1) // chunk_pixels)
+        bottom = int((offset[1] + view_size[1] - 1) // chunk_pixels)
+        self.window = (left - 1, top - 1, right + 1, bottom + 1)
+
+        for position, future in list(self.pending.items()):
+            if future.done():
+                del self.pending[position]
+                self.install_chunk(future.result())
+
+        radius = self.stream_radius
+        for chunk_x in range(left - radius, right + radius + 1):
+            for chunk_y in range(top - radius, bottom + radius + 1):
+                position = (chunk_x, chunk_y)
+                if position in self.resident:
+                    self.resident.move_to_end(position)
+                elif position not in self.level.directory:
+                    continue
+                elif left - 2 <= chunk_x <= right + 2 and top - 2 <= chunk_y <= bottom + 2:
+                    # too close to wait for the loader thread
+                    future = self.pending.pop(position, None)
+                    self.install_chunk(future.result() if future else self.read_chunk(position))
+                elif position not in self.pending:
+                    self.pending[position] = self.loader.submit(self.read_chunk, position)
+
+        while len(self.resident) > self.stream_capacity:
+            position = next(iter(self.resident))
+            if left - radius <= position[0] <= right + radius and top - radius <= position[1] <= bottom + radius:
+                break
+            self.evict_chunk(position)
+
+    def is_resident(self, pos):
+        if self.level is None:
+            return True
+        chunk_pixels = CHUNK_SIZE * self.size
+        chunk_x = pos[0] // chunk_pixels
+        chunk_y = pos[1] // chunk_pixels
+        return self.window[0] <= chunk_x <= self.window[2] and self.window[1] <= chunk_y <= self.window[3]
+
+    def tiles_of_type(self, tile_type):
+        return [self.get_tile(x, y) for x, y in self.type_index.get(tile_type, ())]
+
+    def is_solid(self, x, y):
+        chunk = self.chunks.get((x // CHUNK_SIZE, y // CHUNK_SIZE))
+        if chunk:
+            return chunk.solid[(y % CHUNK_SIZE) * CHUNK_SIZE + x % CHUNK_SIZE]
+        return 0
+
+    def all_tiles(self):
+        tiles = []
+        for chunk in self.chunks.values():
+            for tile in chunk.tiles:
+                if tile is not None:
+                    tiles.append(tile)
+        return tiles
+
+    def tiles_in_range(self, x0, y0, x1, y1):
+        # cells with x0 <= x < x1 and y0 <= y < y1, visited chunk by chunk
+        tiles = []
+        for chunk_x in range(x0 // CHUNK_SIZE, (x1 - 1) // CHUNK_SIZE + 1):
+            for chunk_y in range(y0 // CHUNK_SIZE, (y1 - 1) // CHUNK_SIZE + 1):
+                chunk = self.chunks.get((chunk_x, chunk_y))
+                if not chunk:
+                    continue
+                base_x = chunk_x * CHUNK_SIZE
+                base_y = chunk_y * CHUNK_SIZE
+                for y in range(max(y0, base_y), min(y1, base_y + CHUNK_SIZE)):
+                    row = (y - base_y) * CHUNK_SIZE - base_x
+                    for x in range(max(x0, base_x), min(x1, base_x + CHUNK_SIZE)):
+                        tile = chunk.tiles[row + x]
+                        if tile is not None:
+                            tiles.append(tile)
+        return tiles
+
+    def solid_rects_in_range(self, x0, y0, x1, y1):
+        rects = []
+        for chunk_x in range(x0 // CHUNK_SIZE, (x1 - 1) // CHUNK_SIZE + 1):
+            for chunk_y in range(y0 // CHUNK_SIZE, (y1 - 1) // CHUNK_SIZE + 1):
+                chunk = self.chunks.get((chunk_x, chunk_y))
+                if not chunk:
+                    continue
+                base_x = chunk_x * CHUNK_SIZE
+                base_y = chunk_y * CHUNK_SIZE
+                solid = chunk.solid
+                for y in range(max(y0, base_y), min(y1, base_y + CHUNK_SIZE)):
+                    row = (y - base_y) * CHUNK_SIZE - base_x
+                    for x in range(max(x0, base_x), min(x1, base_x + CHUNK_SIZE)):
+                        if solid[row + x]:
+                            rects.append(chunk.rect(row + x))
+        return rects
+
+    def overlaps_solid(self, rect):
+        return bool(self.solid_rects_in_range(rect.left // self.size, rect.top // self.size, (rect.right - 1) // self.size + 1, (rect.bottom - 1) // self.size + 1))
+
+    def raycast(self, start, end):
+        # first solid cell on the segment from start to end, visiting the cells it crosses in order
+        # (Amanatides and Woo); returns the cell and the point where the segment enters it, or None
+        size = self.size
+        x = int(start[0] // size)
+        y = int(start[1] // size)
+        dx = end[0] - start[0]
+        dy = end[1] - start[1]
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        # distances along the segment as fractions of its length, to the next column and row boundary
+        t_delta_x = abs(size / dx) if dx else float("inf")
+        t_delta_y = abs(size / dy) if dy else float("inf")
+        t_x = ((x + (dx > 0)) * size - start[0]) / dx if dx else float("inf")
+        t_y = ((y + (dy > 0)) * size - start[1]) / dy if dy else float("inf")
+        t = 0
+        while True:
+            if self.is_solid(x, y):
+                return (x, y), (start[0] + dx * t, start[1] + dy * t)
+            if t_x < t_y:
+                t = t_x
+                x += step_x
+                t_x += t_delta_x
+            else:
+                t = t_y
+                y += step_y
+                t_y += t_delta_y
+            if t > 1:
+                return None
+
+    def sweep(self, rect, distance, axis):
+        # how far rect can move along one axis (0 for x, 1 for y), up to distance, before it touches a
+        # solid tile; only the columns or rows its leading edge crosses are checked
+        size = self.size
+        if axis == 0:
+            first, last = rect.top // size, (rect.bottom - 1) // size
+            lead = rect.right if distance > 0 else rect.left
+        else:
+            first, last = rect.left // size, (rect.right - 1) // size
+            lead = rect.bottom if distance > 0 else rect.top
+        target = lead + distance
+        if distance > 0:
+            line = lead // size
+            while line * size < target:
+                for cross in range(first, last + 1):
+                    if self.is_solid(line, cross) if axis == 0 else self.is_solid(cross, line):
+                        return max(0, line * size - lead)
+                line += 1
+        elif distance < 0:
+            line = (lead - 1) // size
+            while (line + 1) * size > target:
+                for cross in range(first, last + 1):
+                    if self.is_solid(line, cross) if axis == 0 else self.is_solid(cross, line):
+                        return min(0, (line + 1) * size - lead)
+                line -= 1
+        return distance
 
     def extract(self,id_pairs, keep=False):
         matches = []
         for tile in self.offgrid_tiles.copy():
-            if (tile["type"], tile["variant"]) in id_pairs:
-                matches.append(tile.copy())
+            if (tile.type, tile.variant) in id_pairs:
+                matches.append(tile.to_dict())
                 if not keep:
-                    self.offgrid_tiles.remove(tile)
+                    self.remove_offgrid(tile)
         
-        for location in self.tilemap:
-            tile = self.tilemap[location]
-            if (tile["type"], tile["variant"]) in id_pairs:
-                matches.append(tile.copy())
-                matches[-1]["pos"] = matches[-1]["pos"].copy()
-                matches[-1]["pos"][0] *= self.size
-                matches[-1]["pos"][1] *= self.size
-                if not keep:
-                    del self.tilemap["location"]
+        for tile_type in {pair[0] for pair in id_pairs}:
+            for tile in self.tiles_of_type(tile_type):
+                if (tile.type, tile.variant) in id_pairs:
+                    matches.append(tile.to_dict())
+                    matches[-1]["pos"][0] *= self.size
+                    matches[-1]["pos"][1] *= self.size
+                    if not keep:
+                        self.remove_tile(tile.pos[0], tile.pos[1])
 
         return matches
                      
-
-    def tiles_around(self, pos, entity_height):
-        tiles = []
-        tile_locations = []
-        difference = 0
-        tile_locations.append((int(pos[0] // self.size), int((pos[1]) // self.size)))
-
+    def tile_location(self, pos, entity_height):
         if entity_height > self.size:
             difference = entity_height - self.size
-            tile_locations.append((int(pos[0] // self.size), int((pos[1] + difference) // self.size)))
+            return (int(pos[0] // self.size), int((pos[1] + difference) // self.size))
+        return (int(pos[0] // self.size), int((pos[1]) // self.size))
 
-        for offset in NEIGHBOR_OFFSETS:
-            for tile_location in tile_locations:
-                check_location = str(tile_location[0] + offset[0]) + ";" + str(tile_location[1] + offset[1])
-                if check_location in self.tilemap:
-                    tiles.append(self.tilemap[check_location])
-        return tiles
+    def tiles_around(self, pos, entity_height):
+        x = int(pos[0] // self.size)
+        top = int(pos[1] // self.size)
+        bottom = self.tile_location(pos, entity_height)[1]
+        return self.tiles_in_range(x - 1, top - 1, x + 2, bottom + 2)
     
     def check_below(self, pos, entity_height):
-        if entity_height > self.size:
-            difference = entity_height - self.size
-            tile_location = (int(pos[0] // self.size), int((pos[1] + difference) // self.size))
-        else:
-            tile_location = (int(pos[0] // self.size), int((pos[1]) // self.size))
+        tile_location = self.tile_location(pos, entity_height)
         check_position = pos[0] + entity_height
-        check_location = str(tile_location[0]) + ";" + str(tile_location[1] + 1)
-        if check_location in self.tilemap:
-            if self.tilemap[check_location]["type"] in PHYSICS_TILES:
-                return (tile_location[1] + 1) * self.size - check_position < 4
+        if self.is_solid(tile_location[0], tile_location[1] + 1):
+            return (tile_location[1] + 1) * self.size - check_position < 4
             
     def check_tile(self, pos, entity_height):
-        if entity_height > self.size:
-            difference = entity_height - self.size
-            tile_location = (int(pos[0] // self.size), int((pos[1] + difference) // self.size))
-        else:
-            tile_location = (int(pos[0] // self.size), int((pos[1]) // self.size))
-        
-        tile_location = str(tile_location[0]) + ";" + str(tile_location[1])
-
-        if tile_location in self.tilemap:
-            return self.tilemap[tile_location]["type"]
+        tile = self.get_tile(*self.tile_location(pos, entity_height))
+        if tile:
+            return tile.type
     
     def rects_around(self, pos, entity_height):
-        rects = []
-        tiles = self.tiles_around(pos, entity_height)
-        for tile in tiles:
-            if tile["type"] in PHYSICS_TILES:
-                rects.append(pygame.Rect(
-                    tile["pos"][0] * self.size,
-                    tile["pos"][1] * self.size,
-                    self.size,
-                    self.size
-                ))
-        return rects
+        x = int(pos[0] // self.size)
+        top = int(pos[1] // self.size)
+        bottom = self.tile_location(pos, entity_height)[1]
+        return self.solid_rects_in_range(x - 1, top - 1, x + 2, bottom + 2)
 
     def update_magic_tiles(self):
-        for location in self.tilemap:
-            tile = self.tilemap[location]
-            if self.game.player.projectile_type == "pink":
-                if tile["type"] == "pink":
-                    self.tilemap[location]["type"] += "_border"
-                elif tile["type"] == "blue_border":
-                    self.tilemap[location]["type"] = "blue"
-
-            elif self.game.player.projectile_type == "blue":
-                if tile["type"] == "blue":
-                    self.tilemap[location]["type"] += "_border"
-                elif tile["type"] == "pink_border":
-                    self.tilemap[location]["type"] = "pink"
+        self.magic_state = self.game.player.projectile_type
+        for old_type, new_type in MAGIC_SWITCHES[self.magic_state].items():
+            for tile in self.tiles_of_type(old_type):
+                self.set_tile_type(tile, new_type)
 
     def remove_yellow_door(self):
-        for location in self.tilemap.copy():
-            tile = self.tilemap[location]
-            if tile["type"] == "yellow_key_door":
-                del self.tilemap[location]
+        self.removed_types.add("yellow_key_door")
+        for tile in self.tiles_of_type("yellow_key_door"):
+            self.base_tiles.setdefault(tile.pos, (tile.type, tile.variant))
+            self.remove_tile(tile.pos[0], tile.pos[1])
     
     def remove_red_door(self):
-        for location in self.tilemap.copy():
-            tile = self.tilemap[location]
-            if tile["type"] == "red_key_door":
-                del self.tilemap[location]
+        self.removed_types.add("red_key_door")
+        for tile in self.tiles_of_type("red_key_door"):
+            self.base_tiles.setdefault(tile.pos, (tile.type, tile.variant))
+            self.remove_tile(tile.pos[0], tile.pos[1])
+
+    def is_loaded(self, x, y):
+        return self.level is None or (x // CHUNK_SIZE, y // CHUNK_SIZE) in self.resident
+
+    def tile_deltas(self):
+        # (x, y, type or None, variant) for every loaded cell that differs from the level file
+        deltas = []
+        for (x, y), base in self.base_tiles.items():
+            if self.is_loaded(x, y):
+                tile = self.get_tile(x, y)
+                if tile is None:
+                    deltas.append((x, y, None, 0))
+                elif (tile.type, tile.variant) != base:
+                    deltas.append((x, y, tile.type, tile.variant))
+        return deltas
+
+    def restore_deltas(self, deltas, magic_state, removed_types):
+        # back to the level file first, then onto the saved cells; chunks that are still on disk
+        # pick the magic state and door removals up when they are installed
+        self.edit([(x, y, base[0], base[1]) for (x, y), base in self.base_tiles.items() if self.is_loaded(x, y)])
+        self.base_tiles = {}
+        for x, y, tile_type, variant in deltas:
+            if self.is_loaded(x, y):
+                tile = self.get_tile(x, y)
+                if tile is not None:
+                    self.base_tiles[(x, y)] = (tile.type, tile.variant)
+        self.edit([delta for delta in deltas if self.is_loaded(delta[0], delta[1])])
+        self.magic_state = magic_state
+        self.removed_types = set(removed_types)
 
     def render(self, surface, offset=(0, 0)):
-        for tile in self.offgrid_tiles:
-            surface.blit(
-                self.game.assets[tile["type"]][tile["variant"]], 
-                (tile["pos"][0] - offset[0], tile["pos"][1] - offset[1]) 
-            )
+        width, height = surface.get_size()
+        for tile in self.offgrid_index.query(pygame.Rect(offset[0], offset[1], width, height)):
+            surface.blit(self.game.assets[tile.type][tile.variant], (tile.pos[0] - offset[0], tile.pos[1] - offset[1]))
 
-        for x in range(offset[0] // self.size - 4, (offset[0] + surface.get_width()) // self.size + 4):
-            for y in range(offset[1] // self.size - 4, (offset[1] + surface.get_height()) // self.size + 4):
-                location = str(x) + ";" + str(y)
+        chunk_pixels = CHUNK_SIZE * self.size
+        for chunk_x in range(offset[0] // chunk_pixels, (offset[0] + width - 1) // chunk_pixels + 1):
+            for chunk_y in range(offset[1] // chunk_pixels, (offset[1] + height - 1) // chunk_pixels + 1):
+                chunk = self.chunks.get((chunk_x, chunk_y))
+                if not chunk:
+                    continue
+                if chunk.dirty:
+                    chunk.bake(self.game.assets)
+                self.baked[chunk.position] = chunk
+                self.baked.move_to_end(chunk.position)
+                surface.blit(chunk.surface, (chunk_x * chunk_pixels - offset[0], chunk_y * chunk_pixels - offset[1]))
+        self.release_baked(self.baked_limit)
 
-                if location in self.tilemap:
-                    tile = self.tilemap[location]
-                    surface.blit(
-                        self.game.assets[tile["type"]][tile["variant"]],
-                        (tile["pos"][0] * self.size - offset[0], tile["pos"][1] * self.size - offset[1])
-                    )
\ No newline at end of file
+    def release_baked(self, limit):
+        # a baked chunk is a full-size surface, so only the most recently drawn ones keep theirs;
+        # the rest bake again if they come back into view
+        while len(self.baked) > limit:
+            position, chunk = self.baked.popitem(last=False)
+            chunk.surface = None
+            chunk.dirty = True
@@ -1,26 +1,70 @@
 import pygame, sys, os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 BASE_IMG_PATH = "data/images/"
+IMAGE_CACHE = {}
+DIRECTORY_CACHE = {}
+TEXT_CACHE = OrderedDict()
+TEXT_CACHE_SIZE = 256
 
-def load_image(path):
-    img = pygame.image.load(BASE_IMG_PATH + path).convert()
+def prepare_image(img):
+    img = img.convert()
     img.set_colorkey((0, 0, 0))
     return img
 
+def load_image(path):
+    img = IMAGE_CACHE.get(path)
+    if img is None:
+        img = IMAGE_CACHE[path] = prepare_image(pygame.image.load(BASE_IMG_PATH + path))
+    return img
+
 def load_images(path):
+    if path not in DIRECTORY_CACHE:
+        DIRECTORY_CACHE[path] = sorted(os.listdir(BASE_IMG_PATH + path))
     images = []
-    for img_name in sorted(os.listdir(BASE_IMG_PATH + path)):
+    for img_name in DIRECTORY_CACHE[path]:
         images.append(load_image(path + "/" + img_name))
     return images
 
+def image_manifest(path=""):
+    # every png under BASE_IMG_PATH + path, as paths relative to BASE_IMG_PATH
+    manifest = []
+    for directory, _, files in os.walk(BASE_IMG_PATH + path):
+        relative = os.path.relpath(directory, BASE_IMG_PATH).replace(os.sep, "/")
+        for img_name in files:
+            if img_name.endswith(".png"):
+                manifest.append(img_name if relative == "." else relative + "/" + img_name)
+    return sorted(manifest)
+
+def preload_images(manifest=None):
+    # decode on a thread pool, then convert to the display format on the calling thread
+    if manifest is None:
+        manifest = image_manifest()
+    missing = [path for path in manifest if path not in IMAGE_CACHE]
+    with ThreadPoolExecutor() as pool:
+        decoded = list(pool.map(lambda path: pygame.image.load(BASE_IMG_PATH + path), missing))
+    for path, img in zip(missing, decoded):
+        IMAGE_CACHE[path] = prepare_image(img)
+
+def text_image(text, font, color):
+    # least recently used surfaces are dropped once the cache holds TEXT_CACHE_SIZE of them
+    key = (font, text, tuple(color))
+    img = TEXT_CACHE.get(key)
+    if img is None:
+        img = TEXT_CACHE[key] = font.render(text, True, color)
+        if len(TEXT_CACHE) > TEXT_CACHE_SIZE:
+            TEXT_CACHE.popitem(last=False)
+    else:
+        TEXT_CACHE.move_to_end(key)
+    return img
+
 def render_text(surface, text, font, color, position):
-    img = font.render(text, True, color)
-    surface.blit(img, position)
+    surface.blit(text_image(text, font, color), position)
 
 def load():
     with open("data/saves/save.txt", "r") as file:
         data = file.read().split("\n")
-        print(data)
         enemy_spawners_holder = data[0].split("__")
         enemy_spawners = []
         for enemy_spawner in enemy_spawners_holder:
@@ -31,15 +75,19 @@ def load():
         player_spawner = (int(player_spawner[0]), int(player_spawner[1]))
         return enemy_spawners, player_spawner
 class Animation:
-    def __init__(self, images : list, duration = 5, loop = True) -> None:
+    __slots__ = ("images", "flipped_images", "duration", "loop", "done", "frame")
+
+    def __init__(self, images : list, duration = 5, loop = True, flipped_images = None) -> None:
         self.images = images
+        # mirrored frames are built on first use and shared by every copy of the animation
+        self.flipped_images = flipped_images if flipped_images is not None else [None] * len(images)
         self.duration = duration
         self.loop = loop
         self.done = False
         self.frame = 0
 
     def copy(self):
-        return Animation(self.images, self.duration, self.loop)
+        return Animation(self.images, self.duration, self.loop, self.flipped_images)
 
     def update(self):
         if self.loop:
@@ -49,17 +97,29 @@ class Animation:
             if self.frame >= len(self.images) * self.duration - 1:
                 self.done = True
 
-    def img(self):
-        return self.images[int(self.frame / self.duration)]
+    def img(self, flip=False):
+        index = int(self.frame / self.duration)
+        if not flip:
+            return self.images[index]
+        img = self.flipped_images[index]
+        if img is None:
+            img = self.flipped_images[index] = pygame.transform.flip(self.images[index], True, False)
+        return img
 
 class Dialogue:
-    def __init__(self, text_collecion, duration = 3) -> None:
+    # incremental=True only renders the characters revealed since the last frame; antialiased edges
+    # can come out slightly different from rendering the whole prefix, so callers opt in
+    def __init__(self, text_collecion, duration = 3, incremental = False) -> None:
         self.text_collecion = text_collecion
         self.dialogue_number = 0
         self.duration = duration
         self.frame = -1
         self.index = 0
         self.done = False
+        self.incremental = incremental
+        self.surface = None
+        self.surface_key = None
+        self.rendered = 0
 
     def advance(self):
         if self.dialogue_number + 1 < len(self.text_collecion):
@@ -83,4 +143,19 @@ class Dialogue:
     
     def render(self, surface, font, color, position):
         text = self.text_collecion[self.dialogue_number]
-        render_text(surface, text[:self.index + 1], font, color, position)
+        if not self.incremental:
+            render_text(surface, text[:self.index + 1], font, color, position)
+            return
+
+        # only the characters revealed since the last call are rendered, onto a surface kept
+        # for the whole line; it starts over when the line, font or colour changes
+        key = (self.dialogue_number, font, tuple(color))
+        if key != self.surface_key or self.index + 1 < self.rendered:
+            self.surface = pygame.Surface(font.size(text), pygame.SRCALPHA)
+            self.surface_key = key
+            self.rendered = 0
+        if self.index + 1 > self.rendered:
+            img = font.render(text[self.rendered:self.index + 1], True, color)
+            self.surface.blit(img, (font.size(text[:self.rendered])[0], 0), special_flags=pygame.BLEND_RGBA_MAX)
+            self.rendered = self.index + 1
+        surface.blit(self.surface, position)
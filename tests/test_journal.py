@@ -0,0 +1,67 @@
+import json, random
+from scripts.tilemap import Tilemap, Tile
+from scripts.journal import MapJournal
+
+TYPES = ("grass", "stone", "pink", "blue")
+
+def write_level(tmp_path, tilemap=None, offgrid=(), journal_sequence=0, journal=()):
+    path = tmp_path / "map.json"
+    path.write_text(json.dumps({"tilemap": tilemap or {}, "tile_size": 48, "offgrid": list(offgrid), "journal_sequence": journal_sequence}))
+    (tmp_path / "map.json.journal").write_text("".join(line + "\n" for line in journal))
+    return str(path)
+
+def open_level(path):
+    tilemap = Tilemap(None, tile_size=48)
+    tilemap.load(path)
+    return tilemap, MapJournal(tilemap, path)
+
+def test_replay_skips_a_cut_off_last_line(tmp_path):
+    path = write_level(tmp_path, journal=['[1, "set", 0, 0, "grass", 1]', '[2, "set", 1, 0, "stone", 2]', '[3, "remove", 0, 0'])
+    tilemap, journal = open_level(path)
+    assert journal.sequence == 2
+    assert (tilemap.get_tile(0, 0).type, tilemap.get_tile(0, 0).variant) == ("grass", 1)
+    assert tilemap.get_tile(1, 0).type == "stone"
+    journal.close()
+    assert json.loads((tmp_path / "map.json").read_text()) == tilemap.map_data()
+
+def test_replay_skips_entries_already_in_the_map(tmp_path):
+    # a crash after write_map replaced the map but before it emptied the journal: entries up to the
+    # map's journal_sequence are already in the map, replaying the off-grid add would duplicate it
+    offgrid = {"type": "grass", "variant": 0, "pos": [10, 20]}
+    path = write_level(tmp_path, {"0;0": {"type": "stone", "variant": 0, "pos": [0, 0]}}, [offgrid], 3, [
+        '[1, "set", 0, 0, "grass", 0]',
+        '[2, "offgrid_add", "grass", 0, 10, 20]',
+        '[3, "set", 0, 0, "stone", 0]',
+        '[4, "set", 1, 0, "pink", 0]',
+        '[5, "remove", 0, 0]',
+    ])
+    tilemap, journal = open_level(path)
+    assert journal.sequence == 5
+    assert len(tilemap.offgrid_tiles) == 1
+    assert tilemap.get_tile(0, 0) is None and tilemap.get_tile(1, 0).type == "pink"
+    journal.close()
+    assert json.loads((tmp_path / "map.json").read_text()) == tilemap.map_data()
+
+def test_compacted_map_matches_the_tilemap_after_random_edits(tmp_path):
+    rng = random.Random(0)
+    path = write_level(tmp_path)
+    tilemap, journal = open_level(path)
+    journal.compact_every = 50
+    for _ in range(300):
+        changes = []
+        for _ in range(rng.randint(1, 8)):
+            x, y = rng.randint(-20, 20), rng.randint(-10, 10)
+            changes.append((x, y, rng.choice(TYPES + (None,)), rng.randint(0, 3)))
+        tilemap.edit(changes)
+        if rng.random() < 0.2:
+            tilemap.add_offgrid(Tile(rng.choice(TYPES), rng.randint(0, 3), (rng.randint(-500, 500), rng.randint(-200, 200))))
+        if tilemap.offgrid_tiles and rng.random() < 0.1:
+            tilemap.remove_offgrid(rng.choice(tilemap.offgrid_tiles))
+        journal.flush()
+    journal.close()
+    assert json.loads((tmp_path / "map.json").read_text()) == tilemap.map_data()
+    assert (tmp_path / "map.json.journal").read_text() == ""
+
+    reopened, journal = open_level(path)
+    assert reopened.map_data() == tilemap.map_data()
+    journal.close()
@@ -0,0 +1,5 @@
+from playtest import playtest
+
+def test_seek_policy_clears_the_level():
+    result = playtest(("data/map.json", 0, "seek", 7200))
+    assert result["outcome"] == "clear", result
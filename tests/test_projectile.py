@@ -0,0 +1,29 @@
+from game import Game
+
+def test_point_blank_shot_stops_at_one_tile_door():
+    # the yellow door is a single column at x = 55, rows -5 to -3; standing flush against it puts
+    # the new shot exactly over the door column
+    game = Game(headless=True, seed=0)
+    game.set_up_game_loop(spawn=False)
+    player = game.player
+    player.position[0] = 55 * 48 - player.size[0]
+    player.position[1] = -2 * 48 - player.size[1]
+    player.flip = False
+    player.shoot()
+    projectile = game.projectiles[0]
+    assert projectile.rect().left == 55 * 48
+    assert projectile.update()
+
+def test_shot_in_the_open_flies_its_full_range():
+    game = Game(headless=True, seed=0)
+    game.set_up_game_loop(spawn=False)
+    player = game.player
+    player.position[0] = 55 * 48 + 60
+    player.position[1] = -2 * 48 - player.size[1]
+    player.flip = False
+    player.shoot()
+    projectile = game.projectiles[0]
+    frames = 0
+    while not projectile.update():
+        frames += 1
+    assert frames == 30
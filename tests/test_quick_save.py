@@ -0,0 +1,41 @@
+import game as game_module
+from game import Game
+
+def saved_game(tmp_path, monkeypatch):
+    monkeypatch.setattr(game_module, "QUICK_SAVE", str(tmp_path / "quick.sav"))
+    game = Game(headless=True, seed=0)
+    game.set_up_game_loop()
+    for _ in range(30):
+        game.update()
+    game.save_quick()
+    return game
+
+def test_quick_save_round_trip(tmp_path, monkeypatch):
+    game = saved_game(tmp_path, monkeypatch)
+    position = list(game.player.position)
+    for _ in range(30):
+        game.update()
+    game.quick_save = None
+    game.load_quick()
+    assert game.player.position == position
+
+def test_cut_off_quick_save_is_dropped_without_touching_the_game(tmp_path, monkeypatch):
+    game = saved_game(tmp_path, monkeypatch)
+    path = tmp_path / "quick.sav"
+    path.write_bytes(path.read_bytes()[:-3])
+    game.quick_save = None
+    player, enemies = game.player, list(game.enemies)
+    game.load_quick()
+    assert game.player is player and game.enemies == enemies
+    assert game.quick_save is None and not path.exists()
+
+def test_quick_save_from_another_version_is_dropped(tmp_path, monkeypatch):
+    game = saved_game(tmp_path, monkeypatch)
+    path = tmp_path / "quick.sav"
+    data = bytearray(path.read_bytes())
+    data[4] += 1
+    path.write_bytes(bytes(data))
+    game.quick_save = None
+    player = game.player
+    game.load_quick()
+    assert game.player is player and not path.exists()
@@ -0,0 +1,14 @@
+import pygame
+from game import Game
+
+def test_static_screen_is_drawn_once_until_the_window_is_exposed():
+    # not headless, which skips loading the fonts; the dummy video driver still keeps it off screen
+    game = Game(seed=0)
+    assert game.render()
+    game.update()
+    assert not game.render()
+    for event_type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE, pygame.WINDOWRESTORED):
+        pygame.event.post(pygame.event.Event(event_type))
+        game.update()
+        assert game.render()
+        assert not game.render()